@@ -0,0 +1,67 @@
+"""Benchmark deferred decorator action lookup.
+
+Registers a large number of actions spread across many fake modules and
+compares the time taken to fire the actions for a single module using
+:func:`tangled.decorators.fire_actions` against a linear scan over all
+registered actions (which is how actions used to be looked up).
+
+Run with ``python benchmarks/bench_actions.py [num_actions]``.
+
+"""
+import sys
+import timeit
+import types
+
+from tangled.decorators import ActionRegistry, fire_actions, register_action
+
+
+def noop():
+    pass
+
+
+def make_wrapped(module_name, name):
+    wrapped = types.SimpleNamespace(__module__=module_name, __qualname__=name)
+    return wrapped
+
+
+def linear_scan(registry, where_fq_name):
+    # Equivalent of the old lookup, without the name boundary check
+    found = []
+    for fq_name, actions in registry.items():
+        if fq_name.startswith(where_fq_name):
+            found.extend(actions)
+    return found
+
+
+def main(num_actions=100000, actions_per_module=10, number=100):
+    registry = ActionRegistry()
+    flat_registry = {}
+    for i in range(num_actions):
+        module_num = i // actions_per_module
+        module_name = 'bench.pkg{}.mod{}'.format(module_num % 100, module_num)
+        wrapped = make_wrapped(module_name, 'func{}'.format(i))
+        register_action(wrapped, noop, _registry=registry)
+        fq_name = '{}.{}'.format(module_name, wrapped.__qualname__)
+        flat_registry.setdefault(fq_name, []).append(noop)
+
+    where = types.ModuleType('bench.pkg1.mod1')
+
+    print('{:,} registered actions'.format(num_actions))
+
+    tree_time = timeit.timeit(
+        lambda: fire_actions(where, _registry=registry), number=number)
+    print('fire_actions:   {:.3f} ms/call (cached plan)'.format(tree_time / number * 1000))
+
+    find_time = timeit.timeit(
+        lambda: [entry.action() for entry in registry.find('bench.pkg1.mod1')],
+        number=number)
+    print('indexed lookup: {:.3f} ms/call'.format(find_time / number * 1000))
+
+    scan_time = timeit.timeit(
+        lambda: [a() for a in linear_scan(flat_registry, 'bench.pkg1.mod1')],
+        number=number)
+    print('linear scan:    {:.3f} ms/call'.format(scan_time / number * 1000))
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
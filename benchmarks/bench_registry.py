@@ -0,0 +1,235 @@
+"""Benchmark registry operations.
+
+Populates a :class:`tangled.registry.Registry` and times each registry
+operation. Read operations are also timed against a frozen snapshot
+created via :meth:`tangled.registry.Registry.freeze` and against a
+:class:`tangled.registry.CopyOnWriteRegistry`.
+
+Concurrent read throughput of a lock-guarded registry is compared with
+a :class:`tangled.registry.CopyOnWriteRegistry` too.
+
+Registering components via :meth:`tangled.registry.Registry.register_many`
+is compared with calling ``register`` in a loop.
+
+Lookups that a :class:`tangled.registry.ChildRegistry` resolves via
+its ancestors are compared with lookups in the root registry, with and
+without the child's cache.
+
+Memory usage of a registry where every key has a single component is
+compared with storing each key's components in an ``OrderedDict``.
+
+Run with ``python benchmarks/bench_registry.py [num_keys]``.
+
+"""
+import sys
+import threading
+import time
+import timeit
+import tracemalloc
+from collections import OrderedDict
+
+from tangled.registry import CopyOnWriteRegistry, Registry
+
+
+def populate(registry, num_keys):
+    for i in range(num_keys):
+        key = 'key{}'.format(i)
+        registry.register(key, i)
+        if i % 10 == 0:
+            registry.register(key, i, 'differentiator')
+    return registry
+
+
+def read_operations(num_keys):
+    key = 'key{}'.format(num_keys // 2)
+    return [
+        ('get', lambda r: r.get(key)),
+        ('get (miss)', lambda r: r.get('missing')),
+        ('get (differentiator)', lambda r: r.get('key0', 'differentiator')),
+        ('get_required', lambda r: r.get_required(key)),
+        ('__getitem__', lambda r: r[key]),
+        ('__getitem__ (list key)', lambda r: r[['key0', 'differentiator']]),
+        ('get_all', lambda r: r.get_all('key0')),
+        ('get_all (as_dict)', lambda r: r.get_all('key0', as_dict=True)),
+        ('contains', lambda r: r.contains(key)),
+        ('has_any', lambda r: r.has_any(key)),
+        ('__len__', lambda r: len(r)),
+    ]
+
+
+def write_operations(num_keys):
+    key = 'key{}'.format(num_keys // 2)
+
+    def register_and_remove(r):
+        r.register('new', 1)
+        r.remove('new')
+
+    def set_and_delete_item(r):
+        r['new'] = 1
+        del r['new']
+
+    return [
+        ('register + remove', register_and_remove),
+        ('register (replace)', lambda r: r.register(key, 1, replace=True)),
+        ('__setitem__ + __delitem__', set_and_delete_item),
+    ]
+
+
+def full_operations():
+    return [
+        ('__iter__', lambda r: list(r)),
+        ('items', lambda r: list(r.items())),
+        ('freeze', lambda r: r.freeze()),
+    ]
+
+
+def bench(registries, operations, number):
+    names = list(registries)
+    print('{:<26}'.format('operation') + ''.join('{:>14}'.format(n) for n in names))
+    for name, operation in operations:
+        row = '{:<26}'.format(name)
+        for registry in registries.values():
+            elapsed = timeit.timeit(lambda: operation(registry), number=number)
+            row += '{:>11.1f} ns'.format(elapsed / number * 1e9)
+        print(row)
+
+
+def bench_threads(registry, num_keys, num_threads, number, lock=None):
+    key = 'key{}'.format(num_keys // 2)
+    get = registry.get
+    start = threading.Event()
+
+    if lock is None:
+        def read():
+            start.wait()
+            for _ in range(number):
+                get(key)
+    else:
+        def read():
+            start.wait()
+            for _ in range(number):
+                with lock:
+                    get(key)
+
+    threads = [threading.Thread(target=read) for _ in range(num_threads)]
+    for thread in threads:
+        thread.start()
+    start_time = time.perf_counter()
+    start.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start_time
+    return num_threads * number / elapsed
+
+
+def bench_child(registry, num_keys, number, max_depth=3):
+    key = 'key{}'.format(num_keys // 2)
+    print('Lookups via ancestors (get {!r} from a child)'.format(key))
+    root = registry.get
+    elapsed = timeit.timeit(lambda: root(key), number=number)
+    print('  root registry:  {:>10.1f} ns'.format(elapsed / number * 1e9))
+    for depth in range(1, max_depth + 1):
+        row = '  depth {}:'.format(depth)
+        for cache_size in (None, 0):
+            child = registry
+            for _ in range(depth):
+                child = child.child()
+                if cache_size is not None:
+                    child.cache_size = cache_size
+            get = child.get
+            get(key)
+            elapsed = timeit.timeit(lambda: get(key), number=number)
+            label = 'uncached' if cache_size == 0 else 'cached'
+            row += '  {} {:>10.1f} ns'.format(label, elapsed / number * 1e9)
+        print(row)
+
+
+def measure_memory(build):
+    tracemalloc.start()
+    try:
+        obj = build()
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del obj
+    return size
+
+
+def bench_memory(num_keys):
+    keys = ['key{}'.format(i) for i in range(num_keys)]
+
+    def build_registry():
+        registry = Registry()
+        for i, key in enumerate(keys):
+            registry.register(key, i)
+        return registry
+
+    def build_dicts():
+        # How the registry stored components before single components
+        # were stored inline.
+        components = OrderedDict()
+        for i, key in enumerate(keys):
+            components[key] = OrderedDict([(None, i)])
+        return components
+
+    registry_size = measure_memory(build_registry)
+    dicts_size = measure_memory(build_dicts)
+    print('Memory for {:,} single-component keys'.format(num_keys))
+    print('  OrderedDict per key: {:>12,} bytes ({:.0f} per key)'.format(
+        dicts_size, dicts_size / num_keys))
+    print('  Registry:            {:>12,} bytes ({:.0f} per key)'.format(
+        registry_size, registry_size / num_keys))
+
+
+def bench_register_many(num_keys, number=10):
+    components = [('key{}'.format(i), i) for i in range(num_keys)]
+
+    def register_loop(registry_type):
+        registry = registry_type()
+        register = registry.register
+        for key, component in components:
+            register(key, component)
+
+    def register_many(registry_type):
+        registry_type().register_many(components)
+
+    print('Registering {:,} components'.format(num_keys))
+    for registry_type in (Registry, CopyOnWriteRegistry):
+        if registry_type is CopyOnWriteRegistry and num_keys > 10000:
+            # Each register call copies the registry
+            continue
+        loop = timeit.timeit(lambda: register_loop(registry_type), number=number) / number
+        many = timeit.timeit(lambda: register_many(registry_type), number=number) / number
+        print('  {:<20} loop {:>8.2f} ms  register_many {:>8.2f} ms'.format(
+            registry_type.__name__, loop * 1e3, many * 1e3))
+
+
+def main(num_keys=10000, number=100000):
+    registry = populate(Registry(), num_keys)
+    registries = {
+        'mutable': registry,
+        'frozen': registry.freeze(),
+        'cow': populate(CopyOnWriteRegistry(), num_keys),
+    }
+    print('{:,} keys, {:,} components\n'.format(num_keys, len(registry)))
+    bench(registries, read_operations(num_keys), number)
+    print()
+    bench({'mutable': registry}, write_operations(num_keys), number)
+    print()
+    bench({'mutable': registry}, full_operations(), max(number // 10000, 1))
+    print()
+    print('Concurrent reads (gets/s)')
+    for num_threads in (1, 2, 4, 8):
+        locked = bench_threads(registry, num_keys, num_threads, number, threading.Lock())
+        cow = bench_threads(registries['cow'], num_keys, num_threads, number)
+        print('{} threads: locked {:>12,.0f}  cow {:>12,.0f}'.format(num_threads, locked, cow))
+    print()
+    bench_child(registry, num_keys, number)
+    print()
+    bench_register_many(num_keys)
+    print()
+    bench_memory(num_keys)
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -11,6 +11,7 @@ setup(
     author='Wyatt Baldwin',
     author_email='self@wyattbaldwin.com',
     packages=PEP420PackageFinder.find(include=['tangled*']),
+    python_requires='>=3.7',
     install_requires=[
         'runcommands>=1.0a27',
     ],
@@ -36,8 +37,6 @@ setup(
         'Intended Audience :: Developers',
         'License :: OSI Approved :: MIT License',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.4',
-        'Programming Language :: Python :: 3.5',
-        'Programming Language :: Python :: 3.6',
+        'Programming Language :: Python :: 3.7',
     ],
 )
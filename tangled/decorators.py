@@ -1,9 +1,18 @@
+import asyncio
+import concurrent.futures
+import contextvars
 import functools
-import pkgutil
+import inspect
+import itertools
 import sys
+import json
 import threading
+import time
+import weakref
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
 
-from tangled.util import fully_qualified_name, load_object
+from tangled.util import fully_qualified_name, import_package, load_object
 
 
 class cached_property:
@@ -206,7 +215,59 @@ class cached_property:
             fake_prop._reset_dependents(obj)
 
 
-def per_instance_lru_cache(maxsize=128, typed=False):
+class _Replay:
+
+    """Lazily buffer the items produced by an iterator for replay.
+
+    Each call to :meth:`__iter__` returns a new iterator that yields the
+    items buffered so far and then continues pulling items from the
+    source iterator, buffering them for other consumers. Items are only
+    produced by the source on demand and only once.
+
+    If the source raises an exception, the exception is re-raised for
+    every consumer that reaches that point in the stream.
+
+    """
+
+    def __init__(self, iterable):
+        self._source = iter(iterable)
+        self._buffer = []
+        self._done = False
+        self._exc = None
+        self._lock = threading.Lock()
+
+    def __iter__(self):
+        buffer = self._buffer
+        lock = self._lock
+        i = 0
+        while True:
+            if i < len(buffer):
+                item = buffer[i]
+            else:
+                with lock:
+                    # Another consumer may have pulled the next item
+                    # while this one was waiting for the lock.
+                    if i < len(buffer):
+                        continue
+                    if self._done:
+                        if self._exc is not None:
+                            raise self._exc
+                        return
+                    try:
+                        item = next(self._source)
+                    except StopIteration:
+                        self._done = True
+                        return
+                    except Exception as exc:
+                        self._done = True
+                        self._exc = exc
+                        raise
+                    buffer.append(item)
+            yield item
+            i += 1
+
+
+def per_instance_lru_cache(maxsize=128, typed=False, replay=False):
     """Least-recently-used cache decorator for methods and properties.
 
     This is based on :func:`functools.lru_cache` in the Python standard
@@ -243,6 +304,14 @@ def per_instance_lru_cache(maxsize=128, typed=False):
             ``self.method(1)`` and ``self.method(1.0)`` will result in
             the same key being generated by default.
 
+        replay (bool): Whether the method returns an iterator (e.g., it's
+            a generator method) that should be memoized lazily. Instead
+            of caching an iterator that's exhausted after first use, the
+            items it produces are buffered on demand and each call
+            returns a new iterator that replays the buffered items and
+            then continues pulling from the original iterator. The
+            result is never materialized up front.
+
     Example::
 
         >>> class C:
@@ -292,6 +361,28 @@ def per_instance_lru_cache(maxsize=128, typed=False):
         >>> C.some_property.fget.cache_info(c)
         CacheInfo(hits=1, misses=1, maxsize=1, currsize=1)
 
+    Generator methods can be memoized using ``replay=True``::
+
+        >>> class R:
+        ...
+        ...     @per_instance_lru_cache(replay=True)
+        ...     def rows(self, n):
+        ...         for i in range(n):
+        ...             print('producing', i)
+        ...             yield i
+
+        >>> r = R()
+        >>> rows = r.rows(3)
+        >>> next(rows)
+        producing 0
+        0
+        >>> list(r.rows(3))  # Replays 0 then pulls the rest
+        producing 1
+        producing 2
+        [0, 1, 2]
+        >>> list(rows)  # Everything is buffered now
+        [1, 2]
+
     """
     if maxsize is not None and not isinstance(maxsize, int):
         raise TypeError('Expected maxsize to be an integer or None')
@@ -302,6 +393,13 @@ def per_instance_lru_cache(maxsize=128, typed=False):
         lock = threading.Lock()
         lru_cache = functools.lru_cache
 
+        if replay:
+            @functools.wraps(method)
+            def cached_method(self, *args, **kwargs):
+                return _Replay(method(self, *args, **kwargs))
+        else:
+            cached_method = method
+
         @functools.wraps(method)
         def wrapper(self, *args, **kwargs):
             with lock:
@@ -314,9 +412,11 @@ def per_instance_lru_cache(maxsize=128, typed=False):
                 key = id(self)
                 instance_wrapper = get_instance_wrapper(key)
                 if instance_wrapper is None:
-                    instance_wrapper = lru_cache(maxsize, typed)(method)
+                    instance_wrapper = lru_cache(maxsize, typed)(cached_method)
                     instance_wrappers[key] = instance_wrapper
             result = instance_wrapper(self, *args, **kwargs)
+            if replay:
+                return iter(result)
             return result
 
         def cache_info(instance):
@@ -340,10 +440,292 @@ def per_instance_lru_cache(maxsize=128, typed=False):
     return decorator
 
 
-_ACTION_REGISTRY = {}
+_Action = namedtuple('_Action', 'order action fq_name tag')
+"""A registered action along with its registration info."""
+
+
+class _ActionTree:
+
+    """Index of deferred actions keyed by dotted name.
+
+    Actions are stored in a tree keyed by the dotted components of the
+    fully qualified name of the object they were registered for. This
+    makes finding the actions under a given name proportional to the
+    size of the subtree under that name rather than to the total number
+    of registered actions. It also respects name boundaries, so
+    ``pkg.mod`` doesn't match ``pkg.module``.
+
+    """
+
+    __slots__ = ('children', 'actions', 'seq')
+
+    _seq = itertools.count()
+
+    def __init__(self):
+        self.children = {}
+        self.actions = None
+        self.seq = None
+
+    def add(self, entry):
+        node = self
+        for part in entry.fq_name.split('.'):
+            children = node.children
+            child = children.get(part)
+            if child is None:
+                child = children[part] = _ActionTree()
+            node = child
+        if node.actions is None:
+            # Record when actions were first registered for this name so
+            # that actions can be returned in registration order.
+            node.actions = []
+            node.seq = next(self._seq)
+        node.actions.append(entry)
+
+    def find(self, fq_name):
+        """Get actions registered at or under ``fq_name``.
+
+        Returns a list of action entries in the order they were
+        registered, grouped by the name they were registered under.
+
+        """
+        node = self
+        for part in fq_name.split('.'):
+            node = node.children.get(part)
+            if node is None:
+                return []
+        found = []
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if node.actions is not None:
+                found.append((node.seq, node.actions))
+            stack.extend(node.children.values())
+        found.sort(key=lambda item: item[0])
+        return [item for _, actions in found for item in actions]
+
+    def remove(self, fq_name, predicate=None):
+        """Remove actions registered at or under ``fq_name``.
+
+        If a ``predicate`` is passed, only entries for which it returns
+        true will be removed. Empty branches are pruned.
+
+        Returns a list of the removed entries.
+
+        """
+        parts = fq_name.split('.')
+        path = [self]
+        node = self
+        for part in parts:
+            node = node.children.get(part)
+            if node is None:
+                return []
+            path.append(node)
+        removed = []
+        node._remove(predicate, removed)
+        # Prune empty nodes on the path to the subtree
+        for i in range(len(parts) - 1, -1, -1):
+            child = path[i + 1]
+            if child.actions is None and not child.children:
+                del path[i].children[parts[i]]
+        return removed
+
+    def _remove(self, predicate, removed):
+        actions = self.actions
+        if actions is not None:
+            if predicate is None:
+                kept = []
+            else:
+                kept = [entry for entry in actions if not predicate(entry)]
+            if len(kept) != len(actions):
+                kept_ids = {id(entry) for entry in kept}
+                removed.extend(entry for entry in actions if id(entry) not in kept_ids)
+                if kept:
+                    self.actions = kept
+                else:
+                    self.actions = self.seq = None
+        children = self.children
+        for name, child in list(children.items()):
+            child._remove(predicate, removed)
+            if child.actions is None and not child.children:
+                del children[name]
+
+
+class ActionRegistry:
+
+    """A registry of deferred decorator actions.
+
+    Actions are registered via :func:`register_action` and fired via
+    :func:`fire_actions`.
+
+    Lookups are compiled into "plans"--the list of actions to fire for a
+    given ``where`` and ``tags``--that are cached until another action
+    is registered, so repeatedly firing the same actions doesn't require
+    loading ``where``, walking packages, or searching for actions again.
+
+    There's a default, process-wide registry. Separate registries can be
+    created and used via :func:`action_registry`. This is useful in
+    tests, for example, so that actions don't accumulate in the default
+    registry.
+
+    """
+
+    def __init__(self):
+        # tag => tree of actions
+        self._trees = {}
+        # Incremented whenever an action is registered or removed
+        self.version = 0
+        self._plans = {}
+        # Actions fired in "once" mode: ID => action entry
+        self._fired = {}
+        self._lock = threading.Lock()
+
+    def add(self, fq_name, action, tag=None, order=0):
+        entry = _Action(order, action, fq_name, tag)
+        with self._lock:
+            tree = self._trees.get(tag)
+            if tree is None:
+                tree = self._trees[tag] = _ActionTree()
+            tree.add(entry)
+            self.version += 1
+            self._plans.clear()
+        return entry
+
+    def remove(self, fq_name, tags=(), action=None):
+        """Remove actions registered at or under ``fq_name``.
+
+        If ``tags`` are specified, only actions with those tags will be
+        removed. If ``action`` is specified, only registrations of that
+        action will be removed.
+
+        Returns the number of registrations removed.
+
+        """
+        if action is None:
+            predicate = None
+        else:
+            predicate = lambda entry: _unwrap_action(entry.action) is action
+        return self._remove(fq_name, tags, predicate)
+
+    def remove_entry(self, entry):
+        """Remove a single registration (as returned from :meth:`add`)."""
+        return self._remove(entry.fq_name, (entry.tag,), lambda e: e is entry)
+
+    def _remove(self, fq_name, tags, predicate):
+        tags = (tags,) if isinstance(tags, str) else tags
+        with self._lock:
+            trees = self._trees
+            removed = []
+            for tag in (tuple(trees) if not tags else tags):
+                tree = trees.get(tag)
+                if tree is not None:
+                    removed.extend(tree.remove(fq_name, predicate))
+                    if tree.actions is None and not tree.children:
+                        del trees[tag]
+            if removed:
+                for entry in removed:
+                    self._fired.pop(id(entry), None)
+                self.version += 1
+                self._plans.clear()
+        return len(removed)
+
+    def find(self, fq_name, tags=(), ignore_missing=False):
+        """Find actions registered at or under ``fq_name``.
+
+        If no ``tags`` are specified, actions for all tags are returned.
+        If any of the specified ``tags`` haven't been registered, a
+        ``KeyError`` will be raised unless ``ignore_missing`` is set.
+
+        Returns a list of action entries sorted by order. Each entry has
+        ``order``, ``action``, ``fq_name``, and ``tag`` attributes.
+        Actions with the same order are kept in tag order and then
+        registration order.
+
+        """
+        trees = self._trees
+        tags = trees.keys() if not tags else tags
+        actions = []
+        for tag in tags:
+            if ignore_missing and tag not in trees:
+                continue
+            actions.extend(trees[tag].find(fq_name))
+        actions.sort(key=lambda entry: entry.order)
+        return actions
+
+    def claim(self, actions):
+        """Claim ``actions`` for firing in "once" mode.
+
+        ``actions`` is a sequence of action entries as returned from
+        :meth:`find`. Returns the entries that haven't been claimed
+        previously and marks them as claimed. Each registration
+        of an action is tracked separately.
+
+        """
+        fired = self._fired
+        unfired = []
+        with self._lock:
+            for item in actions:
+                item_id = id(item)
+                if item_id not in fired:
+                    # Keep a reference so the ID can't be reused
+                    fired[item_id] = item
+                    unfired.append(item)
+        return unfired
+
+    def get_plan(self, key):
+        return self._plans.get(key)
+
+    def set_plan(self, key, version, plan):
+        """Cache ``plan``, unless actions were registered since ``version``."""
+        with self._lock:
+            if version == self.version:
+                self._plans[key] = plan
+
+
+_ACTION_REGISTRY = ActionRegistry()
+_CURRENT_ACTION_REGISTRY = contextvars.ContextVar(
+    'tangled.decorators.action_registry', default=_ACTION_REGISTRY)
+
+
+def get_action_registry():
+    """Get the current action registry.
+
+    This is the default, process-wide registry unless a different
+    registry has been activated via :func:`action_registry`.
+
+    """
+    return _CURRENT_ACTION_REGISTRY.get()
+
+
+@contextmanager
+def action_registry(registry=None):
+    """Use a separate action registry in a ``with`` block.
+
+    While the block is active, :func:`register_action`,
+    :func:`fire_actions`, etc will use ``registry`` (a new, empty
+    :class:`ActionRegistry` if not specified) instead of the default
+    registry. When the block exits, the previous registry becomes
+    current again and, unless it's referenced elsewhere, ``registry``
+    and the actions registered in it can be garbage collected::
+
+        with action_registry() as registry:
+            import mypackage.views  # actions registered in registry
+            fire_actions(mypackage, args=(config,))
+
+    The current registry is tracked per :mod:`contextvars` context, so
+    using a separate registry in one thread or task doesn't affect
+    others. New threads start with the default registry.
+
+    """
+    if registry is None:
+        registry = ActionRegistry()
+    token = _CURRENT_ACTION_REGISTRY.set(registry)
+    try:
+        yield registry
+    finally:
+        _CURRENT_ACTION_REGISTRY.reset(token)
 
 
-def register_action(wrapped, action, tag=None, _registry=_ACTION_REGISTRY):
+def register_action(wrapped, action, tag=None, order=0, weak=False, _registry=None):
     """Register a deferred decorator action.
 
     The action will be performed later when :func:`fire_actions` is
@@ -367,15 +749,131 @@ def register_action(wrapped, action, tag=None, _registry=_ACTION_REGISTRY):
 
         fire_actions(mymodule, tags='x', args=('some arg'))
 
+    Actions are fired in ascending ``order`` and then in registration
+    order. When actions are fired concurrently, actions with the same
+    ``order`` may run concurrently, but all of the actions with a lower
+    ``order`` will have completed before they're started.
+
+    The action can be a coroutine function; see
+    :func:`fire_actions_async`.
+
+    If ``weak`` is set, the registry will hold only a weak reference
+    to ``wrapped`` and the action will be unregistered automatically
+    when ``wrapped`` is garbage collected. The action is stored on
+    ``wrapped`` and the registry holds a proxy for it, so the action
+    can refer to ``wrapped`` (e.g., in a closure) without keeping it
+    alive. ``wrapped`` must support weak references and attribute
+    assignment.
+
+    Returns an entry that can be passed to
+    :meth:`ActionRegistry.remove_entry` to unregister the action. See
+    also :func:`unregister_actions`.
+
     """
-    _registry.setdefault(tag, {})
+    if _registry is None:
+        _registry = _CURRENT_ACTION_REGISTRY.get()
     fq_name = fully_qualified_name(wrapped)
-    actions = _registry[tag].setdefault(fq_name, [])
+    if weak:
+        # Raises TypeError before anything is registered if wrapped
+        # can't be weakly referenced or can't hold the action.
+        action = _make_weak_action(wrapped, action)
+    entry = _registry.add(fq_name, action, tag, order)
+    if weak:
+        weakref.finalize(wrapped, _remove_entry, weakref.ref(_registry), entry)
+    return entry
+
+
+_WEAK_ACTIONS_ATTR = '__tangled_weak_actions__'
+
+
+def _make_weak_action(wrapped, action):
+    """Make a proxy for ``action`` that doesn't keep ``wrapped`` alive.
+
+    Actions usually close over ``wrapped``, so the registry can't hold
+    them directly. Instead, ``action`` is stored on ``wrapped`` and the
+    registry holds a proxy that looks it up via a weak reference to
+    ``wrapped``. This way ``action`` lives exactly as long as
+    ``wrapped`` does.
+
+    """
+    wrapped_ref = weakref.ref(wrapped)
+    actions = vars(wrapped).get(_WEAK_ACTIONS_ATTR) if hasattr(wrapped, '__dict__') else None
+    if actions is None:
+        actions = []
+        try:
+            setattr(wrapped, _WEAK_ACTIONS_ATTR, actions)
+        except (AttributeError, TypeError):
+            raise TypeError(
+                'Cannot weakly register action for {!r}: it does not support attribute '
+                'assignment'.format(wrapped)) from None
+    index = len(actions)
     actions.append(action)
 
+    def get_action():
+        wrapped = wrapped_ref()
+        if wrapped is None:
+            return None
+        return vars(wrapped)[_WEAK_ACTIONS_ATTR][index]
+
+    if inspect.iscoroutinefunction(action):
+        async def weak_action(*args, **kwargs):
+            action = get_action()
+            if action is not None:
+                return await action(*args, **kwargs)
+    else:
+        def weak_action(*args, **kwargs):
+            action = get_action()
+            if action is not None:
+                return action(*args, **kwargs)
+
+    # Not functools.wraps() since __wrapped__ would keep action alive
+    for name in ('__module__', '__name__', '__qualname__', '__doc__'):
+        try:
+            setattr(weak_action, name, getattr(action, name))
+        except AttributeError:
+            pass
+    weak_action.__tangled_get_action__ = get_action
+    return weak_action
+
+
+def _unwrap_action(action):
+    """Get the original action for a (possibly) weakly registered one."""
+    get_action = getattr(action, '__tangled_get_action__', None)
+    return action if get_action is None else get_action()
+
 
-def fire_actions(where, tags=(), args=(), kwargs=None,
-                 _registry=_ACTION_REGISTRY):
+def _remove_entry(registry_ref, entry):
+    registry = registry_ref()
+    if registry is not None:
+        registry.remove_entry(entry)
+
+
+def unregister_actions(where, tags=(), action=None, _registry=None):
+    """Unregister actions registered at or under ``where``.
+
+    ``where`` can be an object or the name of an object. Unlike with
+    :func:`fire_actions`, names aren't imported, so this can be used to
+    unregister the actions for modules that are no longer loaded.
+
+    If ``tags`` are specified, only actions with those tags will be
+    unregistered. If an ``action`` is specified, only registrations of
+    that action will be unregistered.
+
+    Returns the number of registrations removed.
+
+    """
+    if _registry is None:
+        _registry = _CURRENT_ACTION_REGISTRY.get()
+    if isinstance(where, str):
+        fq_name = where.replace(':', '.')
+    else:
+        fq_name = fully_qualified_name(where)
+    return _registry.remove(fq_name, tags, action)
+
+
+def fire_actions(where, tags=(), args=(), kwargs=None, scan=False, decorators=(),
+                 manifest=None, prefetch=False, executor=None, once=False, stats=None,
+                 import_times=None, _registry=None):
     """Fire actions previously registered via :func:`register_action`.
 
     ``where`` is typically a package or module. Only actions registered
@@ -392,25 +890,423 @@ def fire_actions(where, tags=(), args=(), kwargs=None,
     ``*args`` and ``**kwargs`` will be passed to each action that is
     fired.
 
+    When ``where`` is a package, all of the modules in the package are
+    imported by default so that their actions will be registered. If
+    ``scan`` is set, the source of the package's modules will be scanned
+    instead and only the modules that refer to :func:`register_action`,
+    to a function, class, or module level name in the package that
+    refers to it, or to one of the specified ``decorators`` (names of
+    registering decorators defined elsewhere) will be imported.
+    ``manifest`` can be used to persist the scan results to a file. See
+    :func:`tangled.util.scan_package`.
+
+    .. note:: Registering decorators imported from other packages aren't
+        detected automatically when scanning, so their names have to be
+        passed via ``decorators``. Leave ``scan`` off to fall back to
+        importing every module.
+
+    If ``prefetch`` is set, module sources will be read and compiled
+    concurrently before the modules are imported. To find out which
+    modules are slow to import, pass a dict via ``import_times``; it
+    will be updated with the import time of each module imported here
+    (see :func:`tangled.util.import_package`). When the actions to fire
+    are already cached (see below), no modules are imported and
+    ``import_times`` isn't updated.
+
+    The actions to fire for a given ``where`` and ``tags`` are cached
+    until another action is registered. When firing the same actions
+    repeatedly, all of the work above is only done once and firing is
+    just a matter of calling each action.
+
+    Actions are called one after another by default. If an
+    ``executor`` (e.g., a :class:`concurrent.futures.ThreadPoolExecutor`)
+    is passed, actions will be submitted to it instead so that blocking
+    actions can overlap. Actions are run in batches by their ``order``
+    (see :func:`register_action`). If any action in a batch raises an
+    exception, the first such exception will be raised after the batch
+    completes and no further batches will be run.
+
+    Actions that return awaitables (e.g., coroutine functions) can't be
+    fired by this function; a ``TypeError`` will be raised if one is
+    encountered. Use :func:`fire_actions_async` for such actions.
+
+    If ``once`` is set, actions that were already fired in "once" mode
+    will be skipped, so each action will only be fired one time. This
+    makes it possible to fire actions for modules that were imported
+    later without firing the actions for other modules again; see
+    :func:`watch_actions`.
+
+    To find out which actions are slow, pass ``stats=True`` to record
+    the time taken by each action in a new :class:`ActionStats` object
+    or pass an existing :class:`ActionStats` object to add to it. The
+    stats object will be returned. Otherwise, ``None`` is returned.
+
+    """
+    if _registry is None:
+        _registry = _CURRENT_ACTION_REGISTRY.get()
+    actions, callables = _get_plan(
+        where, tags, scan, decorators, manifest, prefetch, import_times, _registry)
+    kwargs = {} if kwargs is None else kwargs
+
+    if once:
+        actions = _registry.claim(actions)
+        callables = [entry.action for entry in actions]
+
+    if stats is True:
+        stats = ActionStats()
+
+    if executor is None:
+        if stats is None:
+            for action in callables:
+                result = action(*args, **kwargs)
+                if result is not None:
+                    _check_not_awaitable(action, result)
+        else:
+            for entry in actions:
+                result = stats.call(entry, args, kwargs)
+                if result is not None:
+                    _check_not_awaitable(entry.action, result)
+    else:
+        submit = executor.submit
+        for batch in _batch_actions(actions):
+            if stats is None:
+                futures = [submit(entry.action, *args, **kwargs) for entry in batch]
+            else:
+                futures = [submit(stats.call, entry, args, kwargs) for entry in batch]
+            concurrent.futures.wait(futures)
+            for entry, future in zip(batch, futures):
+                result = future.result()
+                if result is not None:
+                    _check_not_awaitable(entry.action, result)
+
+    return stats
+
+
+async def fire_actions_async(where, tags=(), args=(), kwargs=None, scan=False, decorators=(),
+                             manifest=None, prefetch=False, executor=None, once=False,
+                             stats=None, import_times=None, _registry=None):
+    """Fire actions previously registered via :func:`register_action`.
+
+    This is the same as :func:`fire_actions` except that actions that
+    return awaitables (e.g., coroutine functions) are awaited. Actions
+    are run in batches by their ``order`` (see :func:`register_action`);
+    the awaitables returned by the actions in a batch are awaited
+    concurrently via :func:`asyncio.gather`.
+
+    Regular (blocking) actions are called directly by default, which
+    will block the event loop. If an ``executor`` is passed, they'll be
+    run in the executor instead. If an action run in the executor
+    returns an awaitable, it will be awaited in the event loop.
+
+    .. note:: Modules are imported synchronously before any actions are
+        fired.
+
+    .. note:: When recording ``stats``, the wall time for an action that
+        returns an awaitable includes the time taken to await it. Since
+        other actions in the same batch run while it's being awaited,
+        the CPU time recorded for it may include theirs.
+
     """
-    where = load_object(where)
-    where_fq_name = fully_qualified_name(where)
-    tags = (tags,) if isinstance(tags, str) else tags
+    if _registry is None:
+        _registry = _CURRENT_ACTION_REGISTRY.get()
+    actions, _ = _get_plan(
+        where, tags, scan, decorators, manifest, prefetch, import_times, _registry)
     kwargs = {} if kwargs is None else kwargs
+    loop = asyncio.get_running_loop()
+
+    if once:
+        actions = _registry.claim(actions)
+
+    if stats is True:
+        stats = ActionStats()
+
+    for batch in _batch_actions(actions):
+        awaitables = []
+        for entry in batch:
+            action = entry.action
+            if executor is not None and not inspect.iscoroutinefunction(action):
+                if stats is None:
+                    call = functools.partial(action, *args, **kwargs)
+                else:
+                    call = functools.partial(stats.call, entry, args, kwargs)
+                result = _run_in_executor(loop, executor, call)
+            elif stats is None:
+                result = action(*args, **kwargs)
+            else:
+                result = stats.call_async(entry, args, kwargs)
+            if inspect.isawaitable(result):
+                awaitables.append(result)
+        if awaitables:
+            await asyncio.gather(*awaitables)
+
+    return stats
+
 
-    if hasattr(where, '__path__'):
-        # Load all modules in package
-        path = where.__path__
-        prefix = where.__name__ + '.'
-        for (_, name, is_pkg) in pkgutil.walk_packages(path, prefix):
-            if name not in sys.modules:
-                __import__(name)
-
-    tags = _registry.keys() if not tags else tags
-
-    for tag in tags:
-        tag_actions = _registry[tag]
-        for fq_name, wrapped_actions in tag_actions.items():
-            if fq_name.startswith(where_fq_name):
-                for action in wrapped_actions:
-                    action(*args, **kwargs)
+class ActionStats:
+
+    """Timing stats for actions fired via :func:`fire_actions`.
+
+    For each action that's fired, the wall time, the CPU time of the
+    thread it ran in, and whether it raised an exception are recorded.
+    Stats are aggregated by the fully qualified name of the object the
+    action was registered for and the action's tag.
+
+    Example::
+
+        stats = fire_actions(mypackage, stats=True)
+        for stat in stats.report(10):
+            print(stat['name'], stat['wall_time'])
+
+    """
+
+    fields = ('name', 'tag', 'calls', 'wall_time', 'cpu_time', 'exceptions')
+
+    def __init__(self):
+        # (name, tag) => [calls, wall time, CPU time, exceptions]
+        self._stats = OrderedDict()
+        self._lock = threading.Lock()
+
+    def call(self, entry, args, kwargs):
+        """Call the action for ``entry`` and record its stats."""
+        wall_timer, cpu_timer = time.perf_counter, time.thread_time
+        failed = False
+        wall_start, cpu_start = wall_timer(), cpu_timer()
+        try:
+            return entry.action(*args, **kwargs)
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            wall_time, cpu_time = wall_timer() - wall_start, cpu_timer() - cpu_start
+            self.record(entry.fq_name, entry.tag, wall_time, cpu_time, failed)
+
+    async def call_async(self, entry, args, kwargs):
+        """Call (and await, if necessary) the action for ``entry``."""
+        wall_timer, cpu_timer = time.perf_counter, time.thread_time
+        failed = False
+        wall_start, cpu_start = wall_timer(), cpu_timer()
+        try:
+            result = entry.action(*args, **kwargs)
+            if inspect.isawaitable(result):
+                result = await result
+            return result
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            wall_time, cpu_time = wall_timer() - wall_start, cpu_timer() - cpu_start
+            self.record(entry.fq_name, entry.tag, wall_time, cpu_time, failed)
+
+    def record(self, name, tag, wall_time, cpu_time, failed=False):
+        key = (name, tag)
+        with self._lock:
+            stat = self._stats.get(key)
+            if stat is None:
+                stat = self._stats[key] = [0, 0.0, 0.0, 0]
+            stat[0] += 1
+            stat[1] += wall_time
+            stat[2] += cpu_time
+            if failed:
+                stat[3] += 1
+
+    def report(self, n=None, sort_by='wall_time'):
+        """Get stats for the ``n`` slowest actions (or all of them).
+
+        Returns a list of dicts with the keys listed in :attr:`fields`,
+        sorted by ``sort_by`` in descending order. Times are totals in
+        seconds.
+
+        """
+        with self._lock:
+            report = [
+                dict(zip(self.fields, key + tuple(stat)))
+                for key, stat in self._stats.items()
+            ]
+        report.sort(key=lambda stat: stat[sort_by], reverse=True)
+        return report if n is None else report[:n]
+
+    def to_json(self, n=None, sort_by='wall_time', **kwargs):
+        """Get :meth:`report` as JSON; ``kwargs`` go to ``json.dumps``."""
+        kwargs.setdefault('default', str)
+        return json.dumps(self.report(n, sort_by), **kwargs)
+
+    def __len__(self):
+        return len(self._stats)
+
+
+def watch_actions(where, tags=(), args=(), kwargs=None, _registry=None):
+    """Fire actions for modules under ``where`` when they're imported.
+
+    This installs an import hook (see :class:`ActionImportHook`) that
+    fires the actions registered by modules in the ``where`` package as
+    they're imported. This is intended for plugins and other modules
+    that are loaded on demand after :func:`fire_actions` has been
+    called::
+
+        fire_actions(mypackage, tags='x', args=(config,), once=True)
+        watch_actions(mypackage, tags='x', args=(config,))
+
+        # Later... fires only the actions registered by the plugin
+        import mypackage.plugins.plugin
+
+    Actions are fired in "once" mode (see :func:`fire_actions`), so
+    actions that were already fired (in "once" mode) won't be fired
+    again.
+
+    Returns the installed hook. Call its ``remove()`` method to stop
+    watching. It can also be used as a context manager.
+
+    """
+    hook = ActionImportHook(where, tags, args, kwargs, _registry)
+    hook.install()
+    return hook
+
+
+class ActionImportHook:
+
+    """Import hook that fires actions for newly imported modules.
+
+    See :func:`watch_actions`.
+
+    """
+
+    def __init__(self, where, tags=(), args=(), kwargs=None, _registry=None):
+        where = load_object(where)
+        self.name = fully_qualified_name(where)
+        self.prefix = self.name + '.'
+        self.tags = (tags,) if isinstance(tags, str) else tuple(tags)
+        self.args = args
+        self.kwargs = {} if kwargs is None else kwargs
+        self.registry = _CURRENT_ACTION_REGISTRY.get() if _registry is None else _registry
+
+    def install(self):
+        if self not in sys.meta_path:
+            sys.meta_path.insert(0, self)
+
+    def remove(self):
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def __enter__(self):
+        self.install()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.remove()
+
+    def find_spec(self, fullname, path, target=None):
+        if not (fullname == self.name or fullname.startswith(self.prefix)):
+            return None
+        # Delegate to the other finders and wrap the loader of the spec
+        # found (if any) so actions will be fired after the module is
+        # executed.
+        for finder in sys.meta_path:
+            if finder is self:
+                continue
+            find_spec = getattr(finder, 'find_spec', None)
+            if find_spec is None:
+                continue
+            spec = find_spec(fullname, path, target)
+            if spec is not None:
+                if hasattr(spec.loader, 'exec_module'):
+                    spec.loader = _ActionFiringLoader(spec.loader, self)
+                return spec
+        return None
+
+    def fire(self, module_name):
+        """Fire actions registered under ``module_name``."""
+        registry = self.registry
+        actions = registry.find(module_name, self.tags, ignore_missing=True)
+        actions = registry.claim(actions)
+        args, kwargs = self.args, self.kwargs
+        for entry in actions:
+            result = entry.action(*args, **kwargs)
+            if result is not None:
+                _check_not_awaitable(entry.action, result)
+
+
+class _ActionFiringLoader:
+
+    """Loader wrapper that fires actions after executing a module."""
+
+    def __init__(self, loader, hook):
+        self._loader = loader
+        self._hook = hook
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        self._loader.exec_module(module)
+        self._hook.fire(module.__name__)
+
+
+def _get_plan(where, tags, scan, decorators, manifest, prefetch, import_times, _registry):
+    """Get the plan for firing actions; see :func:`fire_actions`.
+
+    A plan is a pair containing a tuple of action entries sorted by
+    order and a tuple of just the actions in the same order.
+
+    """
+    tags = (tags,) if isinstance(tags, str) else tuple(tags)
+    key = (where, tags, bool(scan), tuple(decorators) if scan else ())
+
+    try:
+        plan = _registry.get_plan(key)
+    except TypeError:  # Unhashable where, tag, or decorator
+        key = plan = None
+
+    if plan is None:
+        where = load_object(where)
+        where_fq_name = fully_qualified_name(where)
+
+        if hasattr(where, '__path__'):
+            # Load all modules in package or, when scanning, only those
+            # that (probably) register actions.
+            names = ('register_action',) + tuple(decorators) if scan else None
+            times = import_package(where, names, manifest, prefetch)
+            if import_times is not None:
+                import_times.update(times)
+
+        version = _registry.version
+        actions = tuple(_registry.find(where_fq_name, tags))
+        plan = actions, tuple(entry.action for entry in actions)
+
+        if key is not None:
+            _registry.set_plan(key, version, plan)
+
+    return plan
+
+
+async def _run_in_executor(loop, executor, call):
+    """Run ``call`` in ``executor`` and await its result if necessary.
+
+    This handles actions that aren't coroutine functions but return
+    awaitables anyway (e.g., wrappers around coroutine functions).
+
+    """
+    result = await loop.run_in_executor(executor, call)
+    if inspect.isawaitable(result):
+        result = await result
+    return result
+
+
+def _check_not_awaitable(action, result):
+    """Raise a ``TypeError`` if an action returned an awaitable."""
+    if inspect.isawaitable(result):
+        # Avoid the "never awaited" warning for coroutines
+        close = getattr(result, 'close', None)
+        if close is not None:
+            close()
+        raise TypeError(
+            'Action {action!r} returned an awaitable; use fire_actions_async() to fire '
+            'actions that need to be awaited'.format(action=action))
+
+
+def _batch_actions(actions):
+    """Group sorted action entries into batches by order."""
+    for _, batch in itertools.groupby(actions, key=lambda entry: entry.order):
+        yield list(batch)
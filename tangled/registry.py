@@ -1,11 +1,38 @@
+import contextvars
+import gc
+import inspect
+import json
+import threading
+import weakref
 from abc import abstractmethod
-from collections import MutableMapping, MutableSequence, OrderedDict
+from collections import OrderedDict, namedtuple
+from collections.abc import MutableMapping, MutableSequence
+from contextlib import contextmanager
+from types import MappingProxyType
 
-from tangled.decorators import cached_property
+from tangled.util import NOT_SET, atomic_write_json, load_object
 
 
 class ARegistry(MutableMapping):
 
+    #: Incremented whenever a component is registered or removed; can be
+    #: used to check whether anything derived from the registry is stale.
+    version = 0
+
+    # cls => {differentiator => component or NOT_SET}; see get_by_type().
+    # Classes are weakly referenced so that caching doesn't keep
+    # dynamically created classes alive.
+    _type_cache = None
+    _type_cache_token = None
+
+    # Set when an overlay is first created for the registry so that
+    # registries that have never been overlaid don't have to check for
+    # one on every lookup; see Registry.overlay().
+    _has_overlays = False
+
+    #: The registry lookups fall back to; see :class:`ChildRegistry`.
+    parent = None
+
     @abstractmethod
     def register(self, key, component, differentiator=None):
         """Register a component."""
@@ -45,71 +72,1082 @@ class ARegistry(MutableMapping):
         """
         raise NotImplementedError
 
+    def get_by_type(self, cls, differentiator=None, default=None):
+        """Get the component registered for ``cls`` or its nearest base.
+
+        The MRO of ``cls`` is searched in order, so a component
+        registered for a base class will be found for all of its
+        subclasses unless a subclass has its own component::
+
+            registry.register(Model, render_model)
+            registry.register(User, render_user)
+            registry.get_by_type(Admin)  # render_user if Admin < User
+
+        Like :func:`functools.singledispatch`, the result of the search
+        is cached per type (and differentiator) with weak references to
+        the types. The cache is discarded
+        whenever a component is registered or removed. Results aren't
+        cached while an overlay is active.
+
+        """
+        token = self._get_cache_token()
+        if token is None:
+            component = self._find_by_type(cls, differentiator)
+            return default if component is NOT_SET else component
+        cache = self._type_cache
+        if cache is None or self._type_cache_token != token:
+            cache = self._type_cache = weakref.WeakKeyDictionary()
+            self._type_cache_token = token
+        try:
+            cls_cache = cache[cls]
+        except KeyError:
+            cls_cache = cache[cls] = {}
+        try:
+            component = cls_cache[differentiator]
+        except KeyError:
+            component = cls_cache[differentiator] = self._find_by_type(cls, differentiator)
+        return default if component is NOT_SET else component
+
+    def _find_by_type(self, cls, differentiator):
+        get = self.get
+        for base in cls.__mro__:
+            component = get(base, differentiator, NOT_SET)
+            if component is not NOT_SET:
+                return component
+        return NOT_SET
+
+    def _get_cache_token(self):
+        """Get a token for checking whether cached lookups are stale.
+
+        Returns ``None`` if lookups can't be cached currently.
+
+        """
+        if self._has_overlays and self._get_overlay() is not None:
+            return None
+        return self.version
+
+    def _get_overlay(self):
+        if self._has_overlays:
+            overlays = _OVERLAYS.get()
+            if overlays is not None:
+                return overlays.get(self)
+        return None
+
+    def resolve(self, key, differentiator=None, default=None):
+        """Get a component or, for a factory, an instance.
+
+        If the component was registered via
+        :meth:`Registry.register_factory`, an instance is returned
+        according to the factory's lifetime. Otherwise, this is the same
+        as :meth:`get`.
+
+        """
+        component = self.get(key, differentiator, NOT_SET)
+        if component is NOT_SET:
+            return default
+        if isinstance(component, ComponentFactory):
+            return component.get_instance()
+        return component
+
+    def dispose_instances(self):
+        """Dispose of instances cached by factories in this registry.
+
+        Singleton instances and instances belonging to the current
+        thread or component scope are disposed of. New instances will be
+        created the next time they're requested.
+
+        """
+        for component in self._iter_stored_components():
+            if isinstance(component, ComponentFactory):
+                component.dispose()
+
+    def _iter_stored_components(self):
+        raise NotImplementedError
+
+    # MutableMapping interface. Keys must be either a hashable object
+    # (as usual) or a two-element list of [key, differentiator]. In the
+    # former case, the differentiator will be automatically set to None.
+    # In the latter case, a list is required because a list can't be
+    # used as a dictionary key (so we avoid clashes where a key is
+    # passed as a tuple without a differentiator).
+
+    @staticmethod
+    def _get_key_and_differentiator(key):
+        # Check for the common case of an actual list first since it's
+        # much cheaper than the ABC check.
+        if key.__class__ is list or isinstance(key, MutableSequence):
+            key, differentiator = key
+        else:
+            differentiator = None
+        return key, differentiator
+
+
+class LazyComponent:
+
+    """Placeholder for a component that hasn't been loaded yet.
+
+    See :meth:`Registry.register_lazy`.
+
+    """
+
+    __slots__ = ('path',)
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        return load_object(self.path)
+
+    def __repr__(self):
+        return '<{} {}>'.format(self.__class__.__name__, self.path)
+
+
+#: Factory lifetimes; see :meth:`Registry.register_factory`.
+SINGLETON = 'singleton'
+THREAD = 'thread'
+CONTEXT = 'context'
+TRANSIENT = 'transient'
+
+
+_COMPONENT_SCOPE = contextvars.ContextVar('tangled.registry.component_scope', default=None)
+
+
+@contextmanager
+def component_scope():
+    """Create a scope for factories with the ``'context'`` lifetime.
+
+    Instances created by context factories while the scope is active
+    are cached in the scope. When the scope exits, they're disposed of
+    in reverse creation order. Scopes can be nested; instances aren't
+    shared between a scope and the scopes nested in it.
+
+    This is intended to be wrapped around units of work such as
+    requests::
+
+        with component_scope():
+            handle(request)
+
+    """
+    # factory => instance
+    scope = OrderedDict()
+    token = _COMPONENT_SCOPE.set(scope)
+    try:
+        yield scope
+    finally:
+        _COMPONENT_SCOPE.reset(token)
+        for factory, instance in reversed(list(scope.items())):
+            factory.dispose_instance(instance)
+
+
+class ComponentFactory:
+
+    """Creates instances of a component and caches them.
+
+    This is created via :meth:`Registry.register_factory`; one subclass
+    per lifetime.
+
+    """
+
+    lifetime = None
+
+    def __init__(self, factory, dispose=None):
+        self.factory = factory
+        self.dispose_callback = dispose
+
+    def get_instance(self):
+        raise NotImplementedError
+
+    def dispose(self):
+        """Dispose of the cached instance visible from here, if any."""
+
+    def dispose_instance(self, instance):
+        if self.dispose_callback is not None:
+            self.dispose_callback(instance)
+
+    def __repr__(self):
+        return '<{} {} {}>'.format(self.__class__.__name__, self.lifetime, self.factory)
+
+
+class _SingletonFactory(ComponentFactory):
+
+    lifetime = SINGLETON
+
+    def __init__(self, factory, dispose=None):
+        super().__init__(factory, dispose)
+        self._lock = threading.Lock()
+        self._instance = NOT_SET
+
+    def get_instance(self):
+        instance = self._instance
+        if instance is NOT_SET:
+            with self._lock:
+                instance = self._instance
+                if instance is NOT_SET:
+                    instance = self._instance = self.factory()
+        return instance
+
+    def dispose(self):
+        with self._lock:
+            instance, self._instance = self._instance, NOT_SET
+        if instance is not NOT_SET:
+            self.dispose_instance(instance)
+
+
+class _ThreadInstance:
+
+    __slots__ = ('instance', 'finalizer', '__weakref__')
+
+    def __init__(self, instance):
+        self.instance = instance
+
+
+class _ThreadFactory(ComponentFactory):
+
+    lifetime = THREAD
+
+    def __init__(self, factory, dispose=None):
+        super().__init__(factory, dispose)
+        self._local = threading.local()
+
+    def get_instance(self):
+        holder = getattr(self._local, 'holder', None)
+        if holder is None:
+            holder = self._local.holder = _ThreadInstance(self.factory())
+            # The holder is only referenced from the thread's locals, so
+            # it's collected when the thread exits, which triggers this.
+            holder.finalizer = weakref.finalize(holder, self.dispose_instance, holder.instance)
+        return holder.instance
+
+    def dispose(self):
+        holder = getattr(self._local, 'holder', None)
+        if holder is not None:
+            del self._local.holder
+            holder.finalizer()
+
+
+class _ContextFactory(ComponentFactory):
+
+    lifetime = CONTEXT
+
+    def get_instance(self):
+        scope = _COMPONENT_SCOPE.get()
+        if scope is None:
+            raise LookupError(
+                'No component scope is active; use tangled.registry.component_scope()')
+        instance = scope.get(self, NOT_SET)
+        if instance is NOT_SET:
+            instance = scope[self] = self.factory()
+        return instance
+
+    def dispose(self):
+        scope = _COMPONENT_SCOPE.get()
+        if scope is not None and self in scope:
+            self.dispose_instance(scope.pop(self))
+
+
+class _TransientFactory(ComponentFactory):
+
+    lifetime = TRANSIENT
+
+    def get_instance(self):
+        return self.factory()
+
+
+_FACTORY_TYPES = {
+    factory_type.lifetime: factory_type
+    for factory_type in (_SingletonFactory, _ThreadFactory, _ContextFactory, _TransientFactory)
+}
+
+
+# registry => RegistryOverlay
+_OVERLAYS = contextvars.ContextVar('tangled.registry.overlays', default=None)
+
+# Marks components hidden by an overlay
+_REMOVED = type('REMOVED', (), {
+    '__bool__': (lambda self: False),
+    '__repr__': (lambda self: 'REMOVED'),
+})()
+
+
+class RegistryOverlay:
+
+    """Context-local overrides for a registry.
+
+    This is created via :meth:`Registry.overlay`. Only the overridden
+    components are stored here; everything else is read from the
+    registry the overlay was created for (or from an enclosing overlay).
+
+    """
+
+    __slots__ = ('registry', 'parent', '_components')
+
+    def __init__(self, registry, parent=None):
+        self.registry = registry
+        self.parent = parent
+        # key => {differentiator => component or _REMOVED}
+        self._components = {}
+
+    def register(self, key, component, differentiator=None):
+        """Override a component (or add a new one)."""
+        self._components.setdefault(key, OrderedDict())[differentiator] = component
+
+    def remove(self, key, differentiator=None):
+        """Hide a component."""
+        if not self.registry.contains(key, differentiator):
+            raise KeyError([key, differentiator])
+        self.register(key, _REMOVED, differentiator)
+
+    def find(self, key, differentiator=None):
+        """Find a component in this overlay or an enclosing overlay.
+
+        Returns ``NOT_SET`` if the component isn't overridden.
+
+        """
+        overlay = self
+        while overlay is not None:
+            components = overlay._components.get(key)
+            if components is not None and differentiator in components:
+                return components[differentiator]
+            overlay = overlay.parent
+        return NOT_SET
+
+    def overrides(self, key):
+        """Are any components registered under ``key`` overridden?"""
+        overlay = self
+        while overlay is not None:
+            if key in overlay._components:
+                return True
+            overlay = overlay.parent
+        return False
+
+    def merge(self, key, components):
+        """Apply overrides to the registry's ``components`` for ``key``."""
+        chain = []
+        overlay = self
+        while overlay is not None:
+            chain.append(overlay)
+            overlay = overlay.parent
+        merged = OrderedDict(() if components is None else _iter_components(components))
+        for overlay in reversed(chain):
+            for differentiator, component in overlay._components.get(key, {}).items():
+                if component is _REMOVED:
+                    merged.pop(differentiator, None)
+                else:
+                    merged[differentiator] = component
+        return merged
+
+    def keys(self):
+        """Get the overridden keys."""
+        keys = OrderedDict()
+        overlay = self
+        while overlay is not None:
+            keys.update(dict.fromkeys(overlay._components))
+            overlay = overlay.parent
+        return keys.keys()
+
+
+_INDEX_EXTRACTORS = {
+    'differentiator': (lambda key, differentiator, component: differentiator),
+    'key_type': (lambda key, differentiator, component: type(key)),
+}
+
+
+# Most keys have a single component, usually registered under the
+# None differentiator, so to save memory, the components for a key are
+# stored as a (differentiator, component) tuple until a second component
+# is registered under the key. At that point, they're upgraded to an
+# OrderedDict mapping differentiators to components. These helpers work
+# with either form.
+
+def _get_component(components, differentiator, default=None):
+    if components.__class__ is tuple:
+        if components[0] is differentiator or components[0] == differentiator:
+            return components[1]
+        return default
+    return components.get(differentiator, default)
+
+
+def _iter_components(components):
+    """Iterate over ``(differentiator, component)`` pairs."""
+    if components.__class__ is tuple:
+        return (components,)
+    return components.items()
+
+
+def _count_components(components):
+    if components.__class__ is tuple:
+        return 1
+    return len(components)
+
+
+RegistryEvent = namedtuple('RegistryEvent', 'action key differentiator component version')
+RegistryEvent.__doc__ = """A change to a registry.
+
+``action`` is either ``'register'`` or ``'remove'``. ``version`` is
+the registry's version after the change.
+
+"""
+
+
+Subscription = namedtuple('Subscription', 'callback key')
+
+
+# registry => list of RegistryEvents collected in a batch; see
+# Registry.batch()
+_BATCHES = contextvars.ContextVar('tangled.registry.batches', default=None)
+
 
 class Registry(ARegistry):
 
-    """A component registry."""
+    """A component registry.
+
+    If ``instrumented`` is set, lookups will be counted in a
+    :class:`RegistryStats` object that's accessible via the registry's
+    ``stats`` attribute. The instrumented version of the registry class
+    is used in that case, so registries that aren't instrumented don't
+    pay anything for it.
+
+    """
+
+    _subscribers = ()
+
+    # name => (extractor, {value => {(key, differentiator) => None}})
+    _indexes = None
 
-    @cached_property
-    def _components(self):
-        # key => {differentiator => component}
-        return OrderedDict()
+    # Keys that may have components that haven't been loaded yet (see
+    # register_lazy()), so that get_all() and freeze() only have to
+    # look for them under these keys. Keys are added after the lazy
+    # component is stored and discarded before looking for them so that
+    # a concurrent registration in a CopyOnWriteRegistry isn't missed.
+    _lazy_keys = frozenset()
+
+    def __new__(cls, *args, instrumented=False, **kwargs):
+        if instrumented:
+            cls = _get_instrumented_class(cls)
+        self = super().__new__(cls)
+        if instrumented:
+            self.stats = RegistryStats()
+        return self
+
+    def __init__(self, instrumented=False):
+        # key => (differentiator, component) or {differentiator => component}
+        self._components = OrderedDict()
+
+    def __getattr__(self, name):
+        # Support subclasses that don't call __init__(). This is only
+        # called when normal attribute lookup fails, so it doesn't slow
+        # down access to _components once it's set.
+        if name == '_components':
+            self._components = OrderedDict()
+            return self._components
+        raise AttributeError(
+            "'{}' object has no attribute '{}'".format(self.__class__.__name__, name))
 
     def register(self, key, component, differentiator=None, replace=False):
-        if key not in self._components:
-            self._components[key] = OrderedDict()
-        components = self._components[key]
-        if differentiator in components and not replace:
-            existing_component = components[differentiator]
+        _components = self._components
+        _components[key], previous = self._add_component(
+            _components.get(key), key, component, differentiator, replace)
+        if component.__class__ is LazyComponent:
+            self._add_lazy_keys((key,))
+        self.version += 1
+        if self._indexes is not None:
+            self._update_indexes(key, differentiator, previous, component)
+        if self._subscribers:
+            self._publish('register', key, differentiator, component, self.version)
+
+    def register_many(self, components, replace=False):
+        """Register many components at once.
+
+        ``components`` is an iterable of ``(key, component)`` and/or
+        ``(key, component, differentiator)`` tuples.
+
+        All of the components are checked before any are registered. If
+        any are already registered (or appear more than once in
+        ``components``) and ``replace`` isn't set, a ``KeyError`` listing
+        all of them is raised and the registry is left unchanged.
+
+        Subscribers are notified once, as if the components were
+        registered in a :meth:`batch`.
+
+        This is faster than calling :meth:`register` in a loop.
+
+        """
+        pending = self._check_many(self._components, components, replace)
+        changes, lazy_keys = self._apply_many(self._components, pending)
+        if lazy_keys:
+            self._add_lazy_keys(lazy_keys)
+        version = self._changed_many(len(pending), changes)
+        self._notify_many(changes, version)
+
+    def _check_many(self, _components, components, replace):
+        """Normalize ``components`` and check for conflicts in one pass.
+
+        Returns a dict mapping ``(key, differentiator)`` to components
+        in the order they were first seen.
+
+        """
+        pending = {}
+        conflicts = []
+        get_component = _get_component
+        for item in components:
+            if len(item) == 2:
+                (key, component), differentiator = item, None
+            else:
+                key, component, differentiator = item
+            # This also ensures that keys and differentiators are
+            # hashable before anything is registered.
+            entry = (key, differentiator)
+            if not replace:
+                if entry in pending:
+                    conflicts.append(entry)
+                elif key in _components and get_component(
+                        _components[key], differentiator, NOT_SET) is not NOT_SET:
+                    conflicts.append(entry)
+            pending[entry] = component
+        if conflicts:
             raise KeyError(
-                '[{}, {}] already present in registry as {}. Use replace=True '
-                'if you really want to replace it.'
-                .format(key, differentiator, existing_component))
+                '{} already present in registry. Use replace=True if you '
+                'really want to replace them.'
+                .format(', '.join('[{}, {}]'.format(*entry) for entry in conflicts)))
+        return pending
+
+    def _apply_many(self, _components, pending, copy=False):
+        """Register checked ``pending`` components in ``_components``.
+
+        Returns a list of ``(key, differentiator, previous component,
+        component)`` changes if there are indexes or subscribers that
+        need to know about them (or ``None``) and a list of the keys
+        that lazy components were registered under.
+
+        """
+        add_component = self._add_component
+        changes = [] if (self._indexes is not None or self._subscribers) else None
+        lazy_keys = []
+        # Inner dicts already copied in this pass (when copying)
+        copied = set()
+        for (key, differentiator), component in pending.items():
+            components = _components.get(key)
+            if components is None:
+                _components[key] = (differentiator, component)
+                previous = NOT_SET
+            else:
+                _components[key], previous = add_component(
+                    components, key, component, differentiator, True,
+                    copy=copy and key not in copied)
+                if copy:
+                    copied.add(key)
+            if component.__class__ is LazyComponent:
+                lazy_keys.append(key)
+            if changes is not None:
+                changes.append((key, differentiator, previous, component))
+        return changes, lazy_keys
+
+    def _changed_many(self, count, changes):
+        """Update version and indexes after a bulk change.
+
+        Returns the version before the change.
+
+        """
+        version = self.version
+        self.version += count
+        if self._indexes is not None:
+            for key, differentiator, previous, component in changes:
+                self._update_indexes(key, differentiator, previous, component)
+        return version
+
+    def _notify_many(self, changes, version):
+        if self._subscribers and changes:
+            with self.batch():
+                for key, differentiator, _, component in changes:
+                    version += 1
+                    self._publish('register', key, differentiator, component, version)
+
+    def register_lazy(self, key, path, differentiator=None, replace=False):
+        """Register a component by its object path.
+
+        ``path`` is a path like ``'package.module:Thing'``. The
+        component won't be loaded (i.e., its module won't be imported)
+        until it's looked up for the first time. After that, the loaded
+        component takes the place of the path in the registry.
+
+        Components registered this way are loaded when the registry is
+        frozen.
+
+        """
+        self.register(key, LazyComponent(path), differentiator, replace)
+
+    def register_factory(self, key, factory, differentiator=None, lifetime=SINGLETON,
+                         dispose=None, replace=False):
+        """Register a factory that creates instances of a component.
+
+        Instances are retrieved via :meth:`resolve`. ``factory`` is
+        called with no args to create an instance. ``lifetime``
+        determines how long an instance is cached:
+
+        - ``'singleton'``: one instance is created on first use and
+          shared by all threads.
+        - ``'thread'``: one instance is created per thread and disposed
+          of when the thread exits.
+        - ``'context'``: one instance is created per
+          :func:`component_scope` and disposed of when the scope exits.
+        - ``'transient'``: a new instance is created every time; these
+          aren't cached or disposed of.
+
+        ``dispose``, if specified, is called with each cached instance
+        when it's disposed of (e.g., to close connections).
+
+        Returns the :class:`ComponentFactory` that's registered.
+
+        """
+        try:
+            factory_type = _FACTORY_TYPES[lifetime]
+        except KeyError:
+            raise ValueError('Unknown lifetime: {}'.format(lifetime)) from None
+        component = factory_type(factory, dispose)
+        self.register(key, component, differentiator, replace)
+        return component
+
+    def _add_component(self, components, key, component, differentiator, replace, copy=False):
+        """Add ``component`` to the ``components`` registered under ``key``.
+
+        ``components`` is modified in place if possible unless ``copy``
+        is set.
+
+        Returns the new components for ``key`` and the component that was
+        replaced (or ``NOT_SET``).
+
+        """
+        if not components:
+            # No components or only the empty marker left by removal
+            hash(differentiator)  # Reject unhashable differentiators like a dict would
+            return (differentiator, component), NOT_SET
+        if components.__class__ is tuple:
+            existing_differentiator, previous = components
+            same = existing_differentiator is differentiator
+            if same or existing_differentiator == differentiator:
+                if not replace:
+                    self._raise_already_registered(key, differentiator, previous)
+                return (existing_differentiator, component), previous
+            hash(differentiator)
+            return OrderedDict((components, (differentiator, component))), NOT_SET
+        previous = components.get(differentiator, NOT_SET)
+        if previous is not NOT_SET and not replace:
+            self._raise_already_registered(key, differentiator, previous)
+        if copy:
+            components = OrderedDict(components)
         components[differentiator] = component
+        return components, previous
+
+    @staticmethod
+    def _remove_component(components, differentiator, copy=False):
+        """Remove a component from ``components``.
+
+        Returns the new components and the component that was removed.
+        When a single component is left, it's returned in the compact
+        tuple form.
+
+        """
+        if components.__class__ is tuple:
+            if not (components[0] is differentiator or components[0] == differentiator):
+                raise KeyError(differentiator)
+            # An empty dict is left in place as a marker so that
+            # has_any() and get_all() behave the same as when there were
+            # multiple components. Registering under the key again
+            # replaces it with the tuple form.
+            return OrderedDict(), components[1]
+        if copy:
+            components = OrderedDict(components)
+        component = components.pop(differentiator)
+        if len(components) == 1:
+            components = next(iter(components.items()))
+        return components, component
+
+    def _load_lazy(self, key, differentiator, placeholder):
+        component = placeholder.load()
+        # Don't clobber a component that was registered in place of the
+        # placeholder while it was loading.
+        components = self._components.get(key)
+        if components is None:
+            pass
+        elif components.__class__ is tuple:
+            if components[1] is placeholder:
+                self._components[key] = (components[0], component)
+        elif components.get(differentiator) is placeholder:
+            components[differentiator] = component
+        return component
+
+    def _add_lazy_keys(self, keys):
+        if self._lazy_keys.__class__ is frozenset:
+            self._lazy_keys = set()
+        self._lazy_keys.update(keys)
+
+    def _load_all_lazy(self, key):
+        """Load the lazy components registered under ``key``.
+
+        This should only be called when ``key`` is in ``_lazy_keys``.
+        Returns the current components for ``key``.
+
+        """
+        self._lazy_keys.discard(key)
+        components = self._components.get(key)
+        if components is None:
+            return None
+        try:
+            for differentiator, component in tuple(_iter_components(components)):
+                if component.__class__ is LazyComponent:
+                    self._load_lazy(key, differentiator, component)
+        except BaseException:
+            self._add_lazy_keys((key,))
+            raise
+        return self._components.get(key)
+
+    @staticmethod
+    def _raise_already_registered(key, differentiator, existing_component):
+        raise KeyError(
+            '[{}, {}] already present in registry as {}. Use replace=True '
+            'if you really want to replace it.'
+            .format(key, differentiator, existing_component))
+
+    # Lookups are done directly against the underlying dicts rather
+    # than going through the MutableMapping interface since they're
+    # typically on the hot path.
 
     def get(self, key, differentiator=None, default=None):
-        # The super version of get() calls our __getitem__(); if our
-        # __getitem__() raises a KeyError, the default is returned.
-        return super(MutableMapping, self).get([key, differentiator], default)
+        if self._has_overlays:
+            component = self._get_from_overlay(key, differentiator)
+            if component is not NOT_SET:
+                return default if component is _REMOVED else component
+        components = self._components.get(key)
+        if components is None:
+            return default
+        if components.__class__ is tuple:
+            if components[0] is differentiator or components[0] == differentiator:
+                component = components[1]
+            else:
+                return default
+        else:
+            component = components.get(differentiator, default)
+        if component.__class__ is LazyComponent:
+            component = self._load_lazy(key, differentiator, component)
+        return component
 
     def get_required(self, key, differentiator=None):
-        return self[[key, differentiator]]
+        if self._has_overlays:
+            component = self._get_from_overlay(key, differentiator)
+            if component is not NOT_SET:
+                if component is _REMOVED:
+                    raise KeyError([key, differentiator])
+                return component
+        components = self._components.get(key)
+        component = NOT_SET if components is None else _get_component(
+            components, differentiator, NOT_SET)
+        if component is NOT_SET:
+            raise KeyError([key, differentiator])
+        if component.__class__ is LazyComponent:
+            component = self._load_lazy(key, differentiator, component)
+        return component
+
+    def _get_from_overlay(self, key, differentiator):
+        overlay = self._get_overlay()
+        if overlay is None:
+            return NOT_SET
+        return overlay.find(key, differentiator)
 
     def get_all(self, key, default=None, as_dict=False):
-        """Return all components for ``key`` in registration order."""
-        if key in self._components:
-            components = self._components[key]
-        else:
+        """Return all components for ``key`` in registration order.
+
+        If ``as_dict`` is set, a read-only mapping of differentiators
+        to components is returned instead of a tuple. It shouldn't be
+        relied on to reflect later changes to the registry.
+
+        """
+        components = self._components.get(key)
+        if components is not None and key in self._lazy_keys:
+            components = self._load_all_lazy(key)
+        return self._get_all_result(key, components, default, as_dict)
+
+    def _get_all_result(self, key, components, default, as_dict):
+        if self._has_overlays:
+            overlay = self._get_overlay()
+            if overlay is not None and overlay.overrides(key):
+                merged = overlay.merge(key, components)
+                if components is not None or merged:
+                    components = merged
+        if components is None:
             return default
+        if components.__class__ is tuple:
+            if as_dict:
+                return MappingProxyType(OrderedDict((components,)))
+            return (components[1],)
         if as_dict:
-            return components
+            return MappingProxyType(components)
         else:
             return tuple(components.values())
 
     def remove(self, key, differentiator=None):
-        del self._components[key][differentiator]
+        _components = self._components
+        _components[key], component = self._remove_component(_components[key], differentiator)
+        self.version += 1
+        if self._indexes is not None:
+            self._update_indexes(key, differentiator, component, NOT_SET)
+        if self._subscribers:
+            self._publish('remove', key, differentiator, component, self.version)
 
     def contains(self, key, differentiator=None):
-        _components = self._components
-        return key in _components and differentiator in _components[key]
+        if self._has_overlays:
+            component = self._get_from_overlay(key, differentiator)
+            if component is not NOT_SET:
+                return component is not _REMOVED
+        components = self._components.get(key)
+        if components is None:
+            return False
+        return _get_component(components, differentiator, NOT_SET) is not NOT_SET
 
     def has_any(self, key):
+        overlay = self._get_overlay()
+        if overlay is not None and overlay.overrides(key):
+            return bool(self.get_all(key))
         return key in self._components
 
-    # MutableMapping interface. Keys must be either a hashable object
-    # (as usual) or a two-element list of [key, differentiator]. In the
-    # former case, the differentiator will be automatically set to None.
-    # In the latter case, a list is required because a list can't be
-    # used as a dictionary key (so we avoid clashes where a key is
-    # passed as a tuple without a differentiator).
+    def freeze(self):
+        """Get an immutable, read-optimized snapshot of this registry.
 
-    @staticmethod
-    def _get_key_and_differentiator(key):
-        if isinstance(key, MutableSequence):
-            key, differentiator = key
+        This is intended for use once a registry has been populated
+        (e.g., at the end of application startup) and will only be read
+        from. See :class:`FrozenRegistry`.
+
+        If an overlay is active, the snapshot will include its
+        overrides.
+
+        """
+        if self._get_overlay() is not None:
+            return self._freeze_view()
+        for key in tuple(self._lazy_keys):
+            self._load_all_lazy(key)
+        return FrozenRegistry(self._components)
+
+    def _freeze_view(self):
+        components = OrderedDict()
+        for key, differentiator in self:
+            components.setdefault(key, OrderedDict())
+            components[key][differentiator] = self.get_required(key, differentiator)
+        return FrozenRegistry(components)
+
+    @contextmanager
+    def overlay(self):
+        """Override components in the current context only.
+
+        Components registered via the :class:`RegistryOverlay` yielded
+        here take precedence over components in the registry, and
+        components removed via the overlay are hidden. This only
+        affects lookups in the current :mod:`contextvars` context (e.g.,
+        the current thread or asyncio task), and only until the
+        ``with`` block exits::
+
+            with registry.overlay() as overlay:
+                overlay.register(IDatabase, fake_database)
+                handle(request)
+
+        Nothing is copied from the registry, so creating an overlay is
+        cheap regardless of the size of the registry. Overlays can be
+        nested.
+
+        """
+        self._has_overlays = True
+        overlays = _OVERLAYS.get()
+        overlays = {} if overlays is None else overlays.copy()
+        overlay = overlays[self] = RegistryOverlay(self, overlays.get(self))
+        token = _OVERLAYS.set(overlays)
+        try:
+            yield overlay
+        finally:
+            _OVERLAYS.reset(token)
+
+    def _iter_stored_components(self):
+        for components in self._components.values():
+            for _, component in _iter_components(components):
+                yield component
+
+    def subscribe(self, callback, key=NOT_SET):
+        """Subscribe to changes to this registry.
+
+        ``callback`` will be called with a tuple of one or more
+        :class:`RegistryEvent` objects whenever a component is registered or
+        removed. If ``key`` is specified, ``callback`` will only be
+        called for components registered under that key.
+
+        Events are delivered synchronously, after the change is made.
+        Within a :meth:`batch`, events are held until the batch ends.
+
+        Returns a :class:`Subscription` that can be passed to
+        :meth:`unsubscribe`.
+
+        """
+        subscription = Subscription(callback, key)
+        # Subscribers are replaced rather than modified so that they can
+        # be iterated over safely while a callback unsubscribes.
+        self._subscribers = self._subscribers + (subscription,)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        subscribers = list(self._subscribers)
+        subscribers.remove(subscription)
+        self._subscribers = tuple(subscribers)
+
+    @contextmanager
+    def batch(self):
+        """Coalesce change notifications.
+
+        Events for changes made in the ``with`` block are delivered to
+        each subscriber in a single call when the block exits::
+
+            with registry.batch():
+                for key, component in components:
+                    registry.register(key, component)
+
+        Nested batches are merged into the outermost batch.
+
+        Batches are tracked per :mod:`contextvars` context, so only
+        changes made in the current thread (or task) are collected.
+        Changes made concurrently elsewhere are delivered as usual.
+
+        """
+        batches = _BATCHES.get()
+        if batches is not None and self in batches:
+            yield
+            return
+        events = []
+        batches = {} if batches is None else batches.copy()
+        batches[self] = events
+        token = _BATCHES.set(batches)
+        try:
+            yield
+        finally:
+            _BATCHES.reset(token)
+            if events:
+                self._deliver(tuple(events))
+
+    def _publish(self, action, key, differentiator, component, version):
+        event = RegistryEvent(action, key, differentiator, component, version)
+        batches = _BATCHES.get()
+        events = None if batches is None else batches.get(self)
+        if events is not None:
+            events.append(event)
         else:
-            differentiator = None
-        return key, differentiator
+            self._deliver((event,))
+
+    def _deliver(self, events):
+        for callback, key in self._subscribers:
+            if key is NOT_SET:
+                selected = events
+            else:
+                selected = tuple(event for event in events if event.key == key)
+            if selected:
+                callback(selected)
+
+    def add_index(self, name, extractor=None):
+        """Add a secondary index for use with :meth:`query`.
+
+        ``extractor`` is a function that's called with the key,
+        differentiator, and component of each registered component and
+        returns the value to index the component by. The value must be
+        hashable. The index is built from the components currently in
+        the registry and is kept up to date as components are
+        registered and removed.
+
+        If ``extractor`` isn't specified, ``name`` must be one of the
+        built in indexes:
+
+        - ``'differentiator'``: index components by differentiator
+        - ``'key_type'``: index components by the type of their key
+
+        .. note:: Only components registered directly in this registry
+            are indexed (not those in a parent registry or an overlay).
+            For lazily registered components, the extractor is passed
+            the :class:`LazyComponent` placeholder.
+
+        """
+        if extractor is None:
+            try:
+                extractor = _INDEX_EXTRACTORS[name]
+            except KeyError:
+                raise ValueError('Unknown index: {}'.format(name)) from None
+        index = {}
+        for key, components in self._components.items():
+            for differentiator, component in _iter_components(components):
+                value = extractor(key, differentiator, component)
+                self._add_to_index(index, value, (key, differentiator))
+        indexes = dict(self._indexes or {})
+        indexes[name] = (extractor, index)
+        self._indexes = indexes
+
+    def remove_index(self, name):
+        indexes = dict(self._indexes or {})
+        del indexes[name]
+        self._indexes = indexes or None
+
+    def query(self, name, value, as_dict=False):
+        """Get the components whose value in the ``name`` index is ``value``.
+
+        This doesn't scan the registry; see :meth:`add_index`. Returns a
+        tuple of components or, if ``as_dict`` is set, an ordered dict
+        mapping ``(key, differentiator)`` pairs to components.
+
+        """
+        try:
+            index = self._indexes[name][1]
+        except (KeyError, TypeError):
+            raise KeyError('No index named {}'.format(name)) from None
+        _components = self._components
+        results = OrderedDict()
+        for entry in index.get(value, ()):
+            key, differentiator = entry
+            components = _components.get(key)
+            component = NOT_SET if components is None else _get_component(
+                components, differentiator, NOT_SET)
+            if component is NOT_SET:
+                # Removed concurrently (in a CopyOnWriteRegistry)
+                continue
+            if component.__class__ is LazyComponent:
+                component = self._load_lazy(key, differentiator, component)
+            results[entry] = component
+        if as_dict:
+            return results
+        return tuple(results.values())
+
+    def _update_indexes(self, key, differentiator, old_component, new_component):
+        entry = (key, differentiator)
+        for extractor, index in self._indexes.values():
+            if old_component is not NOT_SET:
+                value = extractor(key, differentiator, old_component)
+                self._remove_from_index(index, value, entry)
+            if new_component is not NOT_SET:
+                value = extractor(key, differentiator, new_component)
+                self._add_to_index(index, value, entry)
+
+    @staticmethod
+    def _add_to_index(index, value, entry):
+        entries = index.get(value)
+        if entries is None:
+            entries = index[value] = OrderedDict()
+        entries[entry] = None
+
+    @staticmethod
+    def _remove_from_index(index, value, entry):
+        entries = index[value]
+        del entries[entry]
+        if not entries:
+            del index[value]
+
+    def child(self):
+        """Create a child registry that falls back to this registry.
+
+        See :class:`ChildRegistry`.
+
+        """
+        return ChildRegistry(self)
+
+    # MutableMapping interface (see ARegistry)
 
     def __setitem__(self, key, component):
         key, differentiator = self._get_key_and_differentiator(key)
@@ -117,25 +1155,38 @@ class Registry(ARegistry):
 
     def __getitem__(self, key):
         key, differentiator = self._get_key_and_differentiator(key)
-        if not self.contains(key, differentiator):
-            raise KeyError([key, differentiator])
-        return self._components[key][differentiator]
+        return self.get_required(key, differentiator)
 
     def __delitem__(self, key):
         key, differentiator = self._get_key_and_differentiator(key)
         self.remove(key, differentiator)
 
     def __iter__(self):
-        _components = self._components
-        for key in _components:
-            for differentiator in _components[key]:
+        overlay = self._get_overlay()
+        if overlay is None:
+            return self._iter_without_overlay()
+        return self._iter_with_overlay(overlay)
+
+    def _iter_with_overlay(self, overlay):
+        seen = set()
+        for key, differentiator in self._iter_without_overlay():
+            seen.add((key, differentiator))
+            if overlay.find(key, differentiator) is not _REMOVED:
+                yield [key, differentiator]
+        for key in overlay.keys():
+            for differentiator in overlay.merge(key, None):
+                if (key, differentiator) not in seen:
+                    yield [key, differentiator]
+
+    def _iter_without_overlay(self):
+        for key, components in self._components.items():
+            for differentiator, _ in _iter_components(components):
                 yield [key, differentiator]
 
     def __len__(self):
-        num_components = 0
-        for key in self._components:
-            num_components += len(self._components[key])
-        return num_components
+        if self._get_overlay() is not None:
+            return sum(1 for _ in self)
+        return sum(map(_count_components, self._components.values()))
 
     def __hash__(self):
         return object.__hash__(self)
@@ -147,5 +1198,692 @@ class Registry(ARegistry):
         return '\n'.join(r)
 
 
+class CopyOnWriteRegistry(Registry):
+
+    """A thread-safe registry with lock-free reads.
+
+    The components in this registry are stored in a snapshot that's
+    never modified once it has been published. Each write (registering
+    or removing a component) takes a lock, builds a new snapshot from
+    the current one, and then swaps it in with a single attribute
+    assignment.
+
+    Reads don't take a lock. Each read operation sees either the old
+    snapshot or the new one, never a partially updated one, so reads can
+    proceed in parallel from any number of threads.
+
+    Writes copy the top level dict of the registry, so they're O(n) in
+    the number of keys. This is intended for registries that are read
+    frequently and written to rarely (e.g., after startup).
+
+    """
+
+    def __init__(self, instrumented=False):
+        super().__init__()
+        self._write_lock = threading.Lock()
+
+    def register(self, key, component, differentiator=None, replace=False):
+        with self._write_lock:
+            components = self._components
+            key_components, previous = self._add_component(
+                components.get(key), key, component, differentiator, replace, copy=True)
+            components = components.copy()
+            components[key] = key_components
+            self._components = components
+            if component.__class__ is LazyComponent:
+                self._add_lazy_keys((key,))
+            self.version += 1
+            version = self.version
+            if self._indexes is not None:
+                self._update_indexes(key, differentiator, previous, component)
+        # Subscribers are notified outside the lock so they can write
+        # to the registry.
+        if self._subscribers:
+            self._publish('register', key, differentiator, component, version)
+
+    def remove(self, key, differentiator=None):
+        with self._write_lock:
+            components = self._components
+            key_components, component = self._remove_component(
+                components[key], differentiator, copy=True)
+            components = components.copy()
+            components[key] = key_components
+            self._components = components
+            self.version += 1
+            version = self.version
+            if self._indexes is not None:
+                self._update_indexes(key, differentiator, component, NOT_SET)
+        if self._subscribers:
+            self._publish('remove', key, differentiator, component, version)
+
+    def register_many(self, components, replace=False):
+        with self._write_lock:
+            _components = self._components
+            pending = self._check_many(_components, components, replace)
+            _components = _components.copy()
+            changes, lazy_keys = self._apply_many(_components, pending, copy=True)
+            self._components = _components
+            if lazy_keys:
+                self._add_lazy_keys(lazy_keys)
+            version = self._changed_many(len(pending), changes)
+        self._notify_many(changes, version)
+
+    def _load_lazy(self, key, differentiator, placeholder):
+        component = placeholder.load()
+        # Swap in a new snapshot with the loaded component rather than
+        # modifying the published one.
+        with self._write_lock:
+            _components = self._components
+            components = _components.get(key)
+            if components is None:
+                return component
+            if components.__class__ is tuple:
+                if components[1] is not placeholder:
+                    return component
+                components = (components[0], component)
+            else:
+                if components.get(differentiator) is not placeholder:
+                    return component
+                components = OrderedDict(components)
+                components[differentiator] = component
+            _components = _components.copy()
+            _components[key] = components
+            self._components = _components
+        return component
+
+    def add_index(self, name, extractor=None):
+        with self._write_lock:
+            super().add_index(name, extractor)
+
+    def remove_index(self, name):
+        with self._write_lock:
+            super().remove_index(name)
+
+    # Index entries are replaced rather than modified so that they can
+    # be iterated over in query() without a lock.
+
+    @staticmethod
+    def _add_to_index(index, value, entry):
+        entries = OrderedDict(index.get(value, ()))
+        entries[entry] = None
+        index[value] = entries
+
+    @staticmethod
+    def _remove_from_index(index, value, entry):
+        entries = OrderedDict(index[value])
+        del entries[entry]
+        if entries:
+            index[value] = entries
+        else:
+            del index[value]
+
+
+class ChildRegistry(Registry):
+
+    """A registry that falls back to a parent registry.
+
+    Components registered in a child registry are stored in the child
+    and shadow components registered in its parent under the same key
+    and differentiator. Lookups that miss in the child are resolved via
+    the parent (and its parent, etc). Nothing is copied from the parent,
+    so later changes to the parent are seen by its children.
+
+    Components resolved via the parent are cached in the child. Each
+    cache entry records the combined :attr:`version` of the child's
+    ancestors at the time it was cached. Since versions only ever
+    increase, a change to any ancestor changes the combined version and
+    makes the child's cache entries stale without any explicit
+    invalidation.
+
+    The cache holds at most :attr:`cache_size` entries; when it's full,
+    the oldest entry is discarded. Lookups don't lock the cache, so it
+    may briefly exceed that size when multiple threads use it.
+
+    Components can only be removed from the registry they were
+    registered in.
+
+    This is typically created via :meth:`Registry.child`.
+
+    """
+
+    #: Maximum number of components resolved via ancestors to cache.
+    cache_size = 1024
+
+    def __init__(self, parent, instrumented=False):
+        super().__init__()
+        self.parent = parent
+        ancestors = []
+        while parent is not None:
+            ancestors.append(parent)
+            parent = parent.parent
+        self._ancestors = tuple(ancestors)
+        # (key, differentiator) => (ancestors version, component)
+        self._cache = {}
+
+    def _ancestors_version(self):
+        """Get the combined version of this registry's ancestors.
+
+        Returns ``None`` if an ancestor has an active overlay, since
+        lookups via the ancestors can't be cached in that case.
+
+        """
+        version = 0
+        for registry in self._ancestors:
+            if registry._has_overlays and registry._get_overlay() is not None:
+                return None
+            version += registry.version
+        return version
+
+    def _get_cache_token(self):
+        token = super()._get_cache_token()
+        if token is None:
+            return None
+        version = self._ancestors_version()
+        if version is None:
+            return None
+        return token + version
+
+    def _get_from_parent(self, key, differentiator):
+        """Get component from ancestors or ``NOT_SET``."""
+        # This is _ancestors_version() inlined since it's called on
+        # every lookup that misses in this registry.
+        version = 0
+        for registry in self._ancestors:
+            if registry._has_overlays and registry._get_overlay() is not None:
+                return self.parent.get(key, differentiator, NOT_SET)
+            version += registry.version
+        cache = self._cache
+        cache_key = (key, differentiator)
+        entry = cache.get(cache_key)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        component = self.parent.get(key, differentiator, NOT_SET)
+        if entry is None and len(cache) >= self.cache_size:
+            if not cache:
+                return component
+            # The cache isn't locked, so another thread may evict the
+            # same entry or change the cache while it's being iterated.
+            try:
+                cache.pop(next(iter(cache), None), None)
+            except RuntimeError:
+                pass
+        cache[cache_key] = (version, component)
+        return component
+
+    def _get_local(self, key, differentiator):
+        """Get component from this registry only.
+
+        Returns ``_REMOVED`` if the component is hidden by an overlay or
+        ``NOT_SET`` if it's not found.
+
+        """
+        if self._has_overlays:
+            component = self._get_from_overlay(key, differentiator)
+            if component is not NOT_SET:
+                return component
+        components = self._components.get(key)
+        if components is not None:
+            component = _get_component(components, differentiator, NOT_SET)
+            if component.__class__ is LazyComponent:
+                component = self._load_lazy(key, differentiator, component)
+            return component
+        return NOT_SET
+
+    def _get(self, key, differentiator=None, default=None):
+        # This is _get_local() inlined since it's on the lookup path.
+        if self._has_overlays:
+            component = self._get_from_overlay(key, differentiator)
+            if component is not NOT_SET:
+                return default if component is _REMOVED else component
+        components = self._components.get(key)
+        if components is not None:
+            component = _get_component(components, differentiator, NOT_SET)
+            if component is not NOT_SET:
+                if component.__class__ is LazyComponent:
+                    component = self._load_lazy(key, differentiator, component)
+                return component
+        component = self._get_from_parent(key, differentiator)
+        return default if component is NOT_SET else component
+
+    get = _get
+
+    def get_required(self, key, differentiator=None):
+        # _get() is used so that lookups aren't counted twice in
+        # instrumented registries.
+        component = self._get(key, differentiator, NOT_SET)
+        if component is NOT_SET:
+            raise KeyError([key, differentiator])
+        return component
+
+    def _find_by_type(self, cls, differentiator):
+        # Results are cached in the type cache, so lookups via ancestors
+        # bypass the resolution cache, which would hold strong
+        # references to the types.
+        for base in cls.__mro__:
+            registry = self
+            while isinstance(registry, ChildRegistry):
+                component = registry._get_local(base, differentiator)
+                if component is not NOT_SET:
+                    break
+                registry = registry.parent
+            else:
+                component = registry.get(base, differentiator, NOT_SET)
+            if component is _REMOVED:
+                continue
+            if component is not NOT_SET:
+                return component
+        return NOT_SET
+
+    def get_all(self, key, default=None, as_dict=False):
+        """Return all components for ``key`` in registration order.
+
+        Components from ancestors come first, followed by components
+        registered in this registry that don't shadow them.
+
+        """
+        parent_components = self.parent.get_all(key, as_dict=True)
+        components = self._components.get(key)
+        if parent_components is None and components is None:
+            merged = None
+        else:
+            merged = OrderedDict(parent_components or ())
+            if components and key in self._lazy_keys:
+                components = self._load_all_lazy(key)
+            if components:
+                merged.update(_iter_components(components))
+        return self._get_all_result(key, merged, default, as_dict)
+
+    def contains(self, key, differentiator=None):
+        if self._has_overlays:
+            component = self._get_from_overlay(key, differentiator)
+            if component is not NOT_SET:
+                return component is not _REMOVED
+        components = self._components.get(key)
+        if components is not None:
+            if _get_component(components, differentiator, NOT_SET) is not NOT_SET:
+                return True
+        return self._get_from_parent(key, differentiator) is not NOT_SET
+
+    def has_any(self, key):
+        overlay = self._get_overlay()
+        if overlay is not None and overlay.overrides(key):
+            return bool(self.get_all(key))
+        return key in self._components or self.parent.has_any(key)
+
+    def freeze(self):
+        """Freeze the combined view of this registry and its ancestors."""
+        return self._freeze_view()
+
+    def _iter_without_overlay(self):
+        _components = self._components
+        for key, differentiator in self.parent:
+            components = _components.get(key)
+            if components is None:
+                yield [key, differentiator]
+            elif _get_component(components, differentiator, NOT_SET) is NOT_SET:
+                yield [key, differentiator]
+        yield from super()._iter_without_overlay()
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+class FrozenRegistry(ARegistry):
+
+    """An immutable, read-optimized snapshot of a registry.
+
+    This is created via :meth:`Registry.freeze`. Components are stored in
+    a flat dict keyed by ``(key, differentiator)``, so lookups require a
+    single dict lookup. The results of :meth:`get_all` are computed up
+    front, and the length of the registry is cached.
+
+    Attempting to register or remove a component will raise a
+    ``TypeError``.
+
+    """
+
+    def __init__(self, components):
+        # Plain dicts are used since they're smaller than OrderedDicts
+        # and preserve insertion order too.
+        # (key, differentiator) => component
+        flat = {}
+        # key => (component, ...)
+        all_components = {}
+        # key => {differentiator => component} (read only)
+        all_components_as_dict = {}
+        for key, key_components in components.items():
+            key_components = dict(_iter_components(key_components))
+            for differentiator, component in key_components.items():
+                flat[(key, differentiator)] = component
+            all_components[key] = tuple(key_components.values())
+            all_components_as_dict[key] = MappingProxyType(key_components)
+        self._flat = flat
+        self._all = all_components
+        self._all_as_dict = all_components_as_dict
+        self._len = len(flat)
+
+    def register(self, key, component, differentiator=None, replace=False):
+        raise TypeError('Cannot register components in a frozen registry')
+
+    def get(self, key, differentiator=None, default=None):
+        return self._flat.get((key, differentiator), default)
+
+    def get_required(self, key, differentiator=None):
+        try:
+            return self._flat[(key, differentiator)]
+        except KeyError:
+            raise KeyError([key, differentiator]) from None
+
+    def get_all(self, key, default=None, as_dict=False):
+        """Return all components for ``key`` in registration order."""
+        if as_dict:
+            return self._all_as_dict.get(key, default)
+        return self._all.get(key, default)
+
+    def remove(self, key, differentiator=None):
+        raise TypeError('Cannot remove components from a frozen registry')
+
+    def contains(self, key, differentiator=None):
+        return (key, differentiator) in self._flat
+
+    def has_any(self, key):
+        return key in self._all
+
+    def freeze(self):
+        return self
+
+    def _iter_stored_components(self):
+        return self._flat.values()
+
+    # MutableMapping interface (see ARegistry)
+
+    def __setitem__(self, key, component):
+        key, differentiator = self._get_key_and_differentiator(key)
+        self.register(key, component, differentiator)
+
+    def __getitem__(self, key):
+        key, differentiator = self._get_key_and_differentiator(key)
+        return self.get_required(key, differentiator)
+
+    def __delitem__(self, key):
+        key, differentiator = self._get_key_and_differentiator(key)
+        self.remove(key, differentiator)
+
+    def __iter__(self):
+        for key, differentiator in self._flat:
+            yield [key, differentiator]
+
+    def __len__(self):
+        return self._len
+
+    def __hash__(self):
+        return object.__hash__(self)
+
+    def __repr__(self):
+        r = []
+        for (key, differentiator), component in self._flat.items():
+            r.append('{}, {}: {}'.format(key, differentiator, component))
+        return '\n'.join(r)
+
+
+class RegistryStats:
+
+    """Lookup stats for an instrumented registry.
+
+    Calls, hits, and misses are counted per lookup method, key, and
+    differentiator. Lookups via :meth:`Registry.get_all` and
+    :meth:`Registry.has_any` are recorded with a differentiator of
+    ``None``.
+
+    Example::
+
+        registry = Registry(instrumented=True)
+        ...
+        for stat in registry.stats.report(10):
+            print(stat['method'], stat['key'], stat['calls'])
+
+    """
+
+    fields = ('method', 'key', 'differentiator', 'calls', 'hits', 'misses')
+
+    def __init__(self):
+        # (method, key, differentiator) => [hits, misses]
+        self._stats = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, method, key, differentiator, hit):
+        stat_key = (method, key, differentiator)
+        with self._lock:
+            stat = self._stats.get(stat_key)
+            if stat is None:
+                stat = self._stats[stat_key] = [0, 0]
+            stat[0 if hit else 1] += 1
+
+    def report(self, n=None, sort_by='calls'):
+        """Get stats for the ``n`` hottest lookups (or all of them).
+
+        Returns a list of dicts with the keys listed in :attr:`fields`,
+        sorted by ``sort_by`` in descending order.
+
+        """
+        with self._lock:
+            report = [
+                dict(zip(self.fields, stat_key + (hits + misses, hits, misses)))
+                for stat_key, (hits, misses) in self._stats.items()
+            ]
+        report.sort(key=lambda stat: stat[sort_by], reverse=True)
+        return report if n is None else report[:n]
+
+    def clear(self):
+        with self._lock:
+            self._stats.clear()
+
+    def __len__(self):
+        return len(self._stats)
+
+
+class _InstrumentedRegistry:
+
+    """Mixin that records lookups in ``self.stats``."""
+
+    def get(self, key, differentiator=None, default=None):
+        component = super().get(key, differentiator, NOT_SET)
+        self.stats.record('get', key, differentiator, component is not NOT_SET)
+        return default if component is NOT_SET else component
+
+    def get_required(self, key, differentiator=None):
+        try:
+            component = super().get_required(key, differentiator)
+        except KeyError:
+            self.stats.record('get_required', key, differentiator, False)
+            raise
+        self.stats.record('get_required', key, differentiator, True)
+        return component
+
+    def get_all(self, key, default=None, as_dict=False):
+        components = super().get_all(key, NOT_SET, as_dict)
+        self.stats.record('get_all', key, None, components is not NOT_SET)
+        return default if components is NOT_SET else components
+
+    def contains(self, key, differentiator=None):
+        result = super().contains(key, differentiator)
+        self.stats.record('contains', key, differentiator, result)
+        return result
+
+    def has_any(self, key):
+        result = super().has_any(key)
+        self.stats.record('has_any', key, None, result)
+        return result
+
+
+# registry class => instrumented version of registry class
+_INSTRUMENTED_CLASSES = {}
+
+
+def _get_instrumented_class(cls):
+    if issubclass(cls, _InstrumentedRegistry):
+        return cls
+    instrumented_cls = _INSTRUMENTED_CLASSES.get(cls)
+    if instrumented_cls is None:
+        name = 'Instrumented{}'.format(cls.__name__)
+        instrumented_cls = type(name, (_InstrumentedRegistry, cls), {
+            '__module__': cls.__module__,
+            '__doc__': cls.__doc__,
+        })
+        _INSTRUMENTED_CLASSES[cls] = instrumented_cls
+    return instrumented_cls
+
+
 process_registry = Registry()
 process_registry.register(ARegistry, Registry)
+
+
+# Frozen snapshot of process_registry made by prepare_for_fork()
+_frozen_process_registry = None
+
+
+def get_process_registry():
+    """Get the process registry for reading.
+
+    This is ``process_registry`` until :func:`prepare_for_fork` has been
+    called to freeze it. After that, it's the frozen snapshot of
+    ``process_registry``, so code that runs in forked worker processes
+    should use this to get the shared registry.
+
+    """
+    frozen = _frozen_process_registry
+    return process_registry if frozen is None else frozen
+
+
+def prepare_for_fork(registry=None):
+    """Freeze a populated registry before forking worker processes.
+
+    This is intended to be called in the parent process of a prefork
+    server once the registry is fully populated. The registry is frozen
+    (loading any lazily registered components, see
+    :meth:`Registry.freeze`), then the garbage collector is run and
+    :func:`gc.freeze` is called to move all objects, including the
+    frozen registry, into the permanent generation. Since the collector
+    won't touch those objects in the worker processes, the memory pages
+    they're on are much more likely to stay shared between workers
+    instead of being copied.
+
+    If ``registry`` isn't passed, ``process_registry`` will be frozen
+    and :func:`get_process_registry` will return the frozen snapshot
+    from then on. ``process_registry`` itself isn't replaced, so
+    references to it stay valid and it can still be written to, but
+    changes made to it afterward won't be seen in the snapshot.
+
+    Returns the frozen registry.
+
+    """
+    global _frozen_process_registry
+    if registry is None:
+        registry = _frozen_process_registry = process_registry.freeze()
+    else:
+        registry = registry.freeze()
+    gc.collect()
+    gc.freeze()
+    return registry
+
+
+# Registry snapshots -------------------------------------------------
+
+
+_SNAPSHOT_VERSION = 1
+
+
+def save_snapshot(registry, file_name):
+    """Save the contents of ``registry`` to a snapshot file.
+
+    Keys, differentiators, and components are saved as object paths
+    (e.g., ``'package.module:Thing'``) or, for strings, numbers,
+    booleans, and ``None``, as is. A ``ValueError`` is raised if any of
+    them can't be saved, e.g. because it's an instance rather than a
+    module level class or function.
+
+    Lazily registered components are saved without being loaded.
+
+    The snapshot can be loaded in another process via
+    :func:`load_snapshot`.
+
+    """
+    entries = []
+    errors = []
+    for key, differentiator in registry:
+        component = NOT_SET
+        if isinstance(registry, Registry):
+            # Avoid loading lazy components.
+            components = registry._components.get(key)
+            if components is not None:
+                component = _get_component(components, differentiator, NOT_SET)
+        if component is NOT_SET:
+            component = registry.get_required(key, differentiator)
+        try:
+            entries.append([
+                _encode_snapshot_value(key),
+                _encode_snapshot_value(differentiator),
+                _encode_snapshot_value(component),
+            ])
+        except ValueError as exc:
+            errors.append('[{}, {}]: {}'.format(key, differentiator, exc))
+    if errors:
+        raise ValueError('Cannot save registry snapshot:\n{}'.format('\n'.join(errors)))
+    atomic_write_json(file_name, {'version': _SNAPSHOT_VERSION, 'entries': entries})
+
+
+def load_snapshot(file_name, registry=None, replace=False):
+    """Load a snapshot saved by :func:`save_snapshot` into a registry.
+
+    Keys and differentiators that are object paths are loaded
+    immediately (since they're needed for lookups), but components are
+    registered lazily (see :meth:`Registry.register_lazy`), so their
+    modules won't be imported until they're looked up.
+
+    If ``registry`` isn't passed, a new :class:`Registry` is created.
+
+    Returns the registry.
+
+    """
+    with open(file_name) as fp:
+        data = json.load(fp)
+    if data.get('version') != _SNAPSHOT_VERSION:
+        raise ValueError(
+            'Unsupported registry snapshot version in {}: {}'
+            .format(file_name, data.get('version')))
+    if registry is None:
+        registry = Registry()
+    decode = _decode_snapshot_value
+    registry.register_many((
+        (decode(key), decode(component, lazy=True), decode(differentiator))
+        for key, differentiator, component in data['entries']
+    ), replace=replace)
+    return registry
+
+
+def _encode_snapshot_value(value):
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return {'value': value}
+    if isinstance(value, LazyComponent):
+        return {'path': value.path}
+    if inspect.ismodule(value):
+        path = value.__name__
+    else:
+        module = getattr(value, '__module__', None)
+        qualname = getattr(value, '__qualname__', None)
+        if module is None or qualname is None:
+            raise ValueError('{!r} has no object path'.format(value))
+        path = '{}:{}'.format(module, qualname)
+    try:
+        loaded = load_object(path)
+    except (ImportError, AttributeError, ValueError):
+        loaded = NOT_SET
+    if loaded is not value:
+        raise ValueError('{!r} cannot be loaded from {}'.format(value, path))
+    return {'path': path}
+
+
+def _decode_snapshot_value(value, lazy=False):
+    if 'path' in value:
+        return LazyComponent(value['path']) if lazy else load_object(value['path'])
+    return value['value']
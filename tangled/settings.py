@@ -7,7 +7,14 @@ from tangled.util import (
     abs_path, get_items_with_key_prefix, is_asset_path, is_object_path, load_object)
 
 
-def parse_settings_file(path, section='app', interpolation=None, meta_settings=True, **kwargs):
+# Parsed settings keyed by file name, section, and parse options. Each
+# entry is a (stamps, settings) pair, where stamps identifies the files
+# in the extends chain the settings were parsed from.
+_settings_cache = {}
+
+
+def parse_settings_file(path, section='app', interpolation=None, meta_settings=True, cache=True,
+                        **kwargs):
     """Parse settings from the .ini file at ``path``.
 
     ``path`` can be a file system path or an asset path. ``section``
@@ -19,17 +26,107 @@ def parse_settings_file(path, section='app', interpolation=None, meta_settings=T
     __bases__), and the environment indicated by the file's base name
     (env). Use ``meta_settings=False`` to disable this.
 
+    The ``extends`` chain is resolved iteratively, so each file in it is
+    parsed at most once. If the chain contains a cycle, a ``ValueError``
+    will be raised.
+
+    Parsed settings are cached by file name, section, and parse options.
+    A cached entry is used only if none of the files in the ``extends``
+    chain have changed since they were parsed, as determined by their
+    modification times and sizes. The settings for each base file are
+    cached too, so files that extend the same base share its parsed
+    settings. Each call returns a fresh copy of the cached settings
+    (dicts and lists are copied; other values are shared). Pass
+    ``cache=False`` to always parse the file. Use
+    :func:`clear_settings_cache` to clear the cache.
+
     ``kwargs`` are the keyword args for :func:`parse_settings`.
+    ``required`` settings are checked after the settings from all the
+    files in the ``extends`` chain have been merged.
 
     """
     file_name = abs_path(path)
+    required = kwargs.pop('required', None)
+    settings = _resolve_settings_file(
+        file_name, section, interpolation, meta_settings, cache, kwargs)
+    settings = _copy_settings(settings)
+    if required:
+        check_required(settings, required)
+    return settings
+
+
+def clear_settings_cache():
+    """Clear the cache used by :func:`parse_settings_file`."""
+    _settings_cache.clear()
+
+
+def _resolve_settings_file(file_name, section, interpolation, meta_settings, cache, kwargs):
+    # Walk the extends chain from file_name toward its root, stopping
+    # early at a base whose settings are already cached. Then merge
+    # each file's settings into its base's, from the root back down.
+    if interpolation is None:
+        interpolation_arg, interpolation = None, configparser.ExtendedInterpolation()
+    else:
+        interpolation_arg = interpolation
+
+    chain = []
+    seen = set()
+    base = None
+    name = file_name
+
+    while name is not None:
+        if name in seen:
+            names = [entry[0] for entry in chain] + [name]
+            names = [os.path.relpath(n, os.getcwd()) for n in names]
+            raise ValueError(
+                'Settings files extend each other in a cycle: {}'.format(' -> '.join(names)))
+        seen.add(name)
+        cache_key = None
+        if cache:
+            cache_key = _make_cache_key(name, section, interpolation_arg, meta_settings, kwargs)
+            if cache_key is not None:
+                entry = _settings_cache.get(cache_key)
+                if entry is not None and _stamps_are_current(entry[0]):
+                    base = (name,) + entry
+                    break
+        settings, stamp, base_name = _read_settings_file(
+            name, section, interpolation, meta_settings, kwargs)
+        chain.append((name, settings, stamp, base_name, cache_key))
+        name = base_name
+
+    for name, settings, stamp, base_name, cache_key in reversed(chain):
+        if base is None:
+            stamps = (stamp,)
+        else:
+            base_name, base_stamps, base_settings = base
+            stamps = (stamp,) + base_stamps
+            if meta_settings:
+                settings['__base__'] = base_name
+                settings['__bases__'] = (base_name,) + base_settings['__bases__']
+            # Cached settings are shared, so merge into a copy
+            merged_settings = dict(base_settings)
+            merged_settings.update(settings)
+            settings = merged_settings
+        if cache_key is not None:
+            _settings_cache[cache_key] = (stamps, settings)
+        base = (name, stamps, settings)
+
+    return base[2]
+
+
+def _read_settings_file(file_name, section, interpolation, meta_settings, kwargs):
+    # Parse a single settings file without resolving its base. Returns
+    # the parsed settings, the file's stamp, and the base file name (or
+    # None if the file doesn't extend another file).
     file_dir = os.path.dirname(file_name)
     defaults = {'__dir__': json.dumps(file_dir)}
-    if interpolation is None:
-        interpolation = configparser.ExtendedInterpolation()
     parser = configparser.ConfigParser(
         defaults=defaults, delimiters='=', interpolation=interpolation)
 
+    # Stat before reading so a change made while reading invalidates
+    # the cached entry.
+    stamp = _get_stamp(file_name)
+
     with open(file_name) as fp:
         parser.read_file(fp)
 
@@ -45,8 +142,6 @@ def parse_settings_file(path, section='app', interpolation=None, meta_settings=T
         message = '{exc} in {file_name}'.format_map(locals())
         raise ValueError(message) from None
 
-    required = kwargs.pop('required', None)
-
     if meta_settings:
         settings['__file__'] = file_name
         settings['__base__'] = None
@@ -56,24 +151,61 @@ def parse_settings_file(path, section='app', interpolation=None, meta_settings=T
             env = os.path.splitext(env)[0]
             settings['env'] = env
 
+    base_file_name = None
     extends = settings.pop('extends', None)
     if extends:
         if not is_asset_path(extends):
             extends = os.path.join(file_dir, extends)
-        base_file_name = abs_path(extends)
-        base_settings = parse_settings_file(
-            base_file_name, section, interpolation, meta_settings, **kwargs)
-        if meta_settings:
-            settings['__base__'] = base_file_name
-            settings['__bases__'] = (base_file_name,)
-            settings['__bases__'] += base_settings['__bases__']
-        base_settings.update(settings)
-        settings = base_settings
+        # Normalize so that cycles are detected regardless of how the
+        # base file is referred to (e.g., ./base.ini).
+        base_file_name = os.path.normpath(abs_path(extends))
 
-    if required:
-        check_required(settings, required)
+    return settings, stamp, base_file_name
 
-    return settings
+
+def _get_stamp(file_name):
+    stat = os.stat(file_name)
+    return file_name, stat.st_mtime_ns, stat.st_size
+
+
+def _stamps_are_current(stamps):
+    try:
+        return all(_get_stamp(stamp[0]) == stamp for stamp in stamps)
+    except OSError:
+        return False
+
+
+def _make_cache_key(file_name, section, interpolation, meta_settings, kwargs):
+    # Returns None when the parse options can't be hashed, in which case
+    # the settings aren't cached.
+    try:
+        key = (file_name, section, interpolation, meta_settings, _freeze(kwargs))
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+def _freeze(value):
+    # Types are included so that, e.g., 1 and True aren't treated as
+    # the same option value.
+    if isinstance(value, dict):
+        return dict, tuple((k, _freeze(v)) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return type(value), tuple(_freeze(v) for v in value)
+    if isinstance(value, set):
+        return set, frozenset(_freeze(v) for v in value)
+    return type(value), value
+
+
+def _copy_settings(value):
+    # Copy the containers json.loads() can produce so that callers can't
+    # modify cached settings.
+    if value.__class__ is dict:
+        return {k: _copy_settings(v) for k, v in value.items()}
+    if value.__class__ is list:
+        return [_copy_settings(v) for v in value]
+    return value
 
 
 def parse_settings(settings, defaults={}, required=(), extra={}, prefix=None, strip_prefix=True):
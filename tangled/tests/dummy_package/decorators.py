@@ -0,0 +1,35 @@
+from tangled.decorators import register_action
+
+
+fired = []
+
+
+def dummy_action(wrapped):
+    def action(*args, **kwargs):
+        fired.append((wrapped.__module__, wrapped.__name__))
+    register_action(wrapped, action, tag='dummy')
+    return wrapped
+
+
+class dummy_route:
+
+    def __init__(self, path):
+        self.path = path
+
+    def __call__(self, wrapped):
+        def action(*args, **kwargs):
+            fired.append((wrapped.__module__, wrapped.__name__))
+        register_action(wrapped, action, tag='dummy')
+        return wrapped
+
+
+def make_dummy_decorator(tag):
+    def decorator(wrapped):
+        def action(*args, **kwargs):
+            fired.append((wrapped.__module__, wrapped.__name__))
+        register_action(wrapped, action, tag=tag)
+        return wrapped
+    return decorator
+
+
+dummy_handler = make_dummy_decorator('dummy')
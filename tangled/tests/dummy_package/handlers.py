@@ -0,0 +1,6 @@
+from .decorators import dummy_handler
+
+
+@dummy_handler
+def handle():
+    pass
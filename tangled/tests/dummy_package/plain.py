@@ -0,0 +1,2 @@
+def not_decorated():
+    pass
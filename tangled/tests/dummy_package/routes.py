@@ -0,0 +1,6 @@
+from .decorators import dummy_route
+
+
+@dummy_route('/')
+def route():
+    pass
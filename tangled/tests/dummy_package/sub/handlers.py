@@ -0,0 +1,6 @@
+from .. import decorators
+
+
+@decorators.dummy_action
+def handler():
+    pass
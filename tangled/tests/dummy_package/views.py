@@ -0,0 +1,6 @@
+from .decorators import dummy_action
+
+
+@dummy_action
+def view():
+    pass
@@ -1,10 +1,24 @@
+import asyncio
+import gc
+import json
+import os
+import sys
+import tempfile
 import threading
 import time
+import types
 import unittest
+import weakref
+from concurrent.futures import ThreadPoolExecutor
 from doctest import DocTestSuite
+from unittest import mock
 
 import tangled.decorators
-from tangled.decorators import cached_property
+from tangled.decorators import (
+    ActionRegistry, ActionStats, action_registry, cached_property, fire_actions,
+    fire_actions_async, get_action_registry, register_action, unregister_actions, watch_actions)
+from tangled.tests.dummy_package.decorators import fired as dummy_fired
+from tangled.util import load_object
 
 
 def load_tests(loader, tests, ignore):
@@ -189,3 +203,563 @@ class TestMultiThreading(unittest.TestCase):
         start_event.set()
         for thread in threads:
             thread.join()
+
+
+class Thing:
+
+    def method(self):
+        pass
+
+
+class ThingWithLongerName:
+
+    def method(self):
+        pass
+
+
+class TestActions(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = ActionRegistry()
+        self.fired = []
+
+    def _register(self, wrapped, name, tag=None, order=0):
+        action = lambda *args, **kwargs: self.fired.append((name, args, kwargs))
+        register_action(wrapped, action, tag, order, _registry=self.registry)
+
+    def test_fire_actions(self):
+        self._register(Thing, 'thing')
+        self._register(Thing.method, 'thing.method')
+        fire_actions(Thing, args=(1,), kwargs={'x': 2}, _registry=self.registry)
+        self.assertEqual(self.fired, [
+            ('thing', (1,), {'x': 2}),
+            ('thing.method', (1,), {'x': 2}),
+        ])
+
+    def test_fire_actions_in_registration_order(self):
+        self._register(Thing.method, 'thing.method')
+        self._register(ThingWithLongerName, 'longer')
+        self._register(Thing, 'thing')
+        self._register(Thing.method, 'thing.method 2')
+        fire_actions(__name__, _registry=self.registry)
+        names = [name for name, *_ in self.fired]
+        self.assertEqual(names, ['thing.method', 'thing.method 2', 'longer', 'thing'])
+
+    def test_fire_actions_respects_name_boundaries(self):
+        self._register(Thing, 'thing')
+        self._register(ThingWithLongerName, 'longer')
+        self._register(ThingWithLongerName.method, 'longer.method')
+        fire_actions(Thing, _registry=self.registry)
+        self.assertEqual([name for name, *_ in self.fired], ['thing'])
+
+    def test_fire_actions_with_tags(self):
+        self._register(Thing, 'x', tag='x')
+        self._register(Thing, 'y', tag='y')
+        self._register(Thing, 'z', tag='z')
+        fire_actions(Thing, tags='y', _registry=self.registry)
+        self.assertEqual([name for name, *_ in self.fired], ['y'])
+        fire_actions(Thing, tags=('x', 'z'), _registry=self.registry)
+        self.assertEqual([name for name, *_ in self.fired], ['y', 'x', 'z'])
+
+    def test_fire_actions_with_order(self):
+        self._register(Thing, 'b', order=1)
+        self._register(Thing.method, 'a', tag='x', order=0)
+        self._register(ThingWithLongerName, 'c', order=1)
+        self._register(Thing, 'first', order=-1)
+        fire_actions(__name__, _registry=self.registry)
+        names = [name for name, *_ in self.fired]
+        self.assertEqual(names, ['first', 'a', 'b', 'c'])
+
+    def test_fire_actions_with_executor(self):
+        batches = []
+        barrier = threading.Barrier(2, timeout=10)
+
+        def make_action(name, order):
+            def action(x):
+                # Actions in the same batch must be running concurrently
+                # to get past the barrier.
+                barrier.wait()
+                batches.append((order, name, x))
+            register_action(Thing, action, order=order, _registry=self.registry)
+
+        make_action('a', 1)
+        make_action('b', 1)
+        make_action('c', 2)
+        make_action('d', 2)
+
+        with ThreadPoolExecutor(2) as executor:
+            fire_actions(Thing, args=(1,), executor=executor, _registry=self.registry)
+
+        self.assertEqual([order for order, *_ in batches], [1, 1, 2, 2])
+        self.assertEqual(sorted(name for _, name, _ in batches), ['a', 'b', 'c', 'd'])
+
+    def test_fire_actions_with_executor_raises(self):
+        def bad_action():
+            raise ValueError('bad')
+
+        self._register(Thing, 'first')
+        register_action(Thing, bad_action, _registry=self.registry)
+        self._register(Thing, 'later', order=1)
+
+        with ThreadPoolExecutor(2) as executor:
+            with self.assertRaises(ValueError):
+                fire_actions(Thing, executor=executor, _registry=self.registry)
+
+        self.assertEqual([name for name, *_ in self.fired], ['first'])
+
+    def test_fire_actions_async(self):
+        events = []
+
+        def make_action(name, order):
+            async def action(x):
+                events.append(('start', name))
+                await asyncio.sleep(0)
+                events.append(('end', name))
+            register_action(Thing, action, order=order, _registry=self.registry)
+
+        make_action('a', 0)
+        make_action('b', 0)
+        make_action('c', 1)
+        self._register(Thing, 'sync', order=1)
+
+        coro = fire_actions_async(Thing, args=(1,), _registry=self.registry)
+        asyncio.run(coro)
+
+        # a and b overlap; c only starts after both have finished
+        self.assertEqual(events, [
+            ('start', 'a'), ('start', 'b'), ('end', 'a'), ('end', 'b'),
+            ('start', 'c'), ('end', 'c'),
+        ])
+        self.assertEqual(self.fired, [('sync', (1,), {})])
+
+    def test_fire_actions_rejects_coroutine_actions(self):
+        async def action():
+            pass
+
+        register_action(Thing, action, _registry=self.registry)
+        with ThreadPoolExecutor(2) as executor:
+            for kwargs in ({}, {'stats': True}, {'executor': executor}):
+                with self.subTest(**kwargs):
+                    with self.assertRaisesRegex(TypeError, 'fire_actions_async'):
+                        fire_actions(Thing, _registry=self.registry, **kwargs)
+
+    def test_fire_actions_async_with_executor(self):
+        self._register(Thing, 'sync')
+        with ThreadPoolExecutor(2) as executor:
+            coro = fire_actions_async(Thing, executor=executor, _registry=self.registry)
+            asyncio.run(coro)
+        self.assertEqual(self.fired, [('sync', (), {})])
+
+    def test_fire_actions_async_with_executor_awaits_returned_awaitables(self):
+        async def action():
+            await asyncio.sleep(0)
+            self.fired.append(('wrapped async', (), {}))
+
+        register_action(Thing, lambda: action(), _registry=self.registry)
+        with ThreadPoolExecutor(2) as executor:
+            for stats in (None, True):
+                with self.subTest(stats=stats):
+                    self.fired.clear()
+                    coro = fire_actions_async(
+                        Thing, executor=executor, stats=stats, _registry=self.registry)
+                    asyncio.run(coro)
+                    self.assertEqual(self.fired, [('wrapped async', (), {})])
+
+    def _fire_counting_loads(self, *args, **kwargs):
+        # Plans are built only on a cache miss, and building a plan is
+        # the only thing that calls load_object().
+        with mock.patch('tangled.decorators.load_object', wraps=load_object) as load:
+            fire_actions(*args, _registry=self.registry, **kwargs)
+        return load.call_count
+
+    def test_fire_actions_uses_cached_plan(self):
+        self._register(Thing, 'a')
+        self.assertEqual(self._fire_counting_loads(Thing), 1)
+        self.assertEqual(self._fire_counting_loads(Thing), 0)
+        self.assertEqual([name for name, *_ in self.fired], ['a', 'a'])
+
+    def test_registering_invalidates_cached_plan(self):
+        self._register(Thing, 'a')
+        self.assertEqual(self._fire_counting_loads(Thing), 1)
+        self._register(Thing, 'b')
+        self.assertEqual(self._fire_counting_loads(Thing), 1)
+        self.assertEqual(self._fire_counting_loads(Thing), 0)
+        self.assertEqual([name for name, *_ in self.fired], ['a', 'a', 'b', 'a', 'b'])
+
+    def test_cached_plans_are_per_tags(self):
+        self._register(Thing, 'x', tag='x')
+        self._register(Thing, 'y', tag='y')
+        self.assertEqual(self._fire_counting_loads(Thing, tags=['x']), 1)
+        self.assertEqual(self._fire_counting_loads(Thing, tags='y'), 1)
+        self.assertEqual(self._fire_counting_loads(Thing, tags=('x',)), 0)
+        self.assertEqual([name for name, *_ in self.fired], ['x', 'y', 'x'])
+
+    def test_fire_actions_none_registered(self):
+        self._register(Thing, 'thing')
+        fire_actions('tangled.util', _registry=self.registry)
+        self.assertEqual(self.fired, [])
+
+
+class TestScopedActionRegistries(unittest.TestCase):
+
+    def test_action_registry(self):
+        default_registry = get_action_registry()
+        fired = []
+        with action_registry() as registry:
+            self.assertIsNot(registry, default_registry)
+            self.assertIs(get_action_registry(), registry)
+            register_action(Thing, lambda: fired.append('scoped'), tag='scoped')
+            fire_actions(Thing, tags='scoped')
+            self.assertEqual(fired, ['scoped'])
+        self.assertIs(get_action_registry(), default_registry)
+        self.assertEqual(default_registry.find(__name__ + '.Thing', ['scoped'], True), [])
+
+    def test_nested_action_registries(self):
+        outer = ActionRegistry()
+        with action_registry(outer):
+            with action_registry() as inner:
+                self.assertIs(get_action_registry(), inner)
+            self.assertIs(get_action_registry(), outer)
+
+    def test_action_registry_is_per_thread(self):
+        default_registry = get_action_registry()
+        entered, done = threading.Event(), threading.Event()
+        other_thread_registries = []
+
+        def other_thread():
+            entered.wait()
+            other_thread_registries.append(get_action_registry())
+            register_action(Thing, lambda: None, tag='other_thread')
+            done.set()
+
+        thread = threading.Thread(target=other_thread)
+        thread.start()
+        with action_registry() as registry:
+            entered.set()
+            done.wait()
+        thread.join()
+        self.assertEqual(other_thread_registries, [default_registry])
+        self.assertEqual(registry.find(__name__ + '.Thing', ['other_thread'], True), [])
+        unregister_actions(Thing, tags='other_thread')
+
+    def test_interleaved_action_registries(self):
+        default_registry = get_action_registry()
+        first_entered = asyncio.Event()
+        second_exited = asyncio.Event()
+        seen = {}
+
+        async def first():
+            with action_registry() as registry:
+                first_entered.set()
+                await second_exited.wait()
+                seen['first'] = get_action_registry() is registry
+            seen['first after'] = get_action_registry()
+
+        async def second():
+            await first_entered.wait()
+            with action_registry() as registry:
+                seen['second'] = get_action_registry() is registry
+            seen['second after'] = get_action_registry()
+            second_exited.set()
+
+        async def main():
+            await asyncio.gather(first(), second())
+
+        asyncio.run(main())
+        self.assertEqual(seen, {
+            'first': True,
+            'first after': default_registry,
+            'second': True,
+            'second after': default_registry,
+        })
+        self.assertIs(get_action_registry(), default_registry)
+
+
+class TestUnregisterActions(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = ActionRegistry()
+        self.fired = []
+
+    def _register(self, wrapped, name, tag=None, **kwargs):
+        action = lambda: self.fired.append(name)
+        register_action(wrapped, action, tag, _registry=self.registry, **kwargs)
+        return action
+
+    def _fire(self):
+        self.fired.clear()
+        fire_actions(__name__, _registry=self.registry)
+        return self.fired
+
+    def test_unregister_actions(self):
+        self._register(Thing, 'thing')
+        self._register(Thing.method, 'thing.method')
+        self._register(ThingWithLongerName, 'longer')
+        self.assertEqual(self._fire(), ['thing', 'thing.method', 'longer'])
+        count = unregister_actions(Thing, _registry=self.registry)
+        self.assertEqual(count, 2)
+        self.assertEqual(self._fire(), ['longer'])
+        self.assertEqual(unregister_actions(Thing, _registry=self.registry), 0)
+
+    def test_unregister_actions_by_name(self):
+        self._register(Thing.method, 'thing.method')
+        self._register(ThingWithLongerName, 'longer')
+        count = unregister_actions(__name__ + ':Thing', _registry=self.registry)
+        self.assertEqual(count, 1)
+        count = unregister_actions(__name__, _registry=self.registry)
+        self.assertEqual(count, 1)
+        self.assertEqual(self._fire(), [])
+
+    def test_unregister_actions_with_tags(self):
+        self._register(Thing, 'x', tag='x')
+        self._register(Thing, 'y', tag='y')
+        unregister_actions(Thing, tags='x', _registry=self.registry)
+        self.assertEqual(self._fire(), ['y'])
+
+    def test_unregister_action(self):
+        action = self._register(Thing, 'a')
+        self._register(Thing, 'b')
+        register_action(Thing, action, _registry=self.registry)
+        self.assertEqual(self._fire(), ['a', 'b', 'a'])
+        count = unregister_actions(Thing, action=action, _registry=self.registry)
+        self.assertEqual(count, 2)
+        self.assertEqual(self._fire(), ['b'])
+
+    def test_remove_entry(self):
+        action = lambda: self.fired.append('a')
+        entry = register_action(Thing, action, _registry=self.registry)
+        register_action(Thing, action, _registry=self.registry)
+        self.assertEqual(self.registry.remove_entry(entry), 1)
+        self.assertEqual(self._fire(), ['a'])
+
+    def test_weak(self):
+        class Temporary:
+            pass
+
+        self._register(Temporary, 'temp', weak=True)
+        self._register(Thing, 'thing')
+        self.assertEqual(self._fire(), ['temp', 'thing'])
+        del Temporary
+        gc.collect()
+        self.assertEqual(self._fire(), ['thing'])
+
+    def test_weak_with_action_that_refers_to_wrapped(self):
+        def decorator(wrapped):
+            def action():
+                self.fired.append(wrapped.__name__)
+            register_action(wrapped, action, weak=True, _registry=self.registry)
+            return wrapped
+
+        @decorator
+        def temporary():
+            pass
+
+        ref = weakref.ref(temporary)
+        self.assertEqual(self._fire(), ['temporary'])
+        del temporary
+        gc.collect()
+        self.assertIsNone(ref())
+        self.assertEqual(self._fire(), [])
+        self.assertEqual(self.registry.find(__name__, ignore_missing=True), [])
+
+    def test_weak_coroutine_action(self):
+        class Temporary:
+            pass
+
+        async def action():
+            self.fired.append('temp')
+
+        register_action(Temporary, action, weak=True, _registry=self.registry)
+        asyncio.run(fire_actions_async(__name__, _registry=self.registry))
+        self.assertEqual(self.fired, ['temp'])
+
+    def test_unregister_weak_action(self):
+        class Temporary:
+            pass
+
+        action = self._register(Temporary, 'temp', weak=True)
+        self.assertEqual(unregister_actions(Temporary, action=action, _registry=self.registry), 1)
+        self.assertEqual(self._fire(), [])
+
+    def test_weak_with_object_that_cant_be_weakly_referenced(self):
+        obj = types.SimpleNamespace(__module__=__name__, __qualname__='obj')
+        with self.assertRaises(TypeError):
+            self._register(obj, 'obj', weak=True)
+        self.assertEqual(self.registry.find(__name__ + '.obj', ignore_missing=True), [])
+
+
+class TestActionStats(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = ActionRegistry()
+
+        def slow():
+            time.sleep(0.02)
+
+        def fast():
+            pass
+
+        def bad():
+            raise ValueError('bad')
+
+        register_action(Thing, slow, tag='x', _registry=self.registry)
+        register_action(Thing.method, fast, tag='x', _registry=self.registry)
+        register_action(Thing.method, fast, tag='y', _registry=self.registry)
+        self.bad = bad
+
+    def test_no_stats(self):
+        self.assertIsNone(fire_actions(Thing, _registry=self.registry))
+
+    def test_stats(self):
+        stats = fire_actions(Thing, stats=True, _registry=self.registry)
+        self.assertIsInstance(stats, ActionStats)
+        self.assertIs(fire_actions(Thing, stats=stats, _registry=self.registry), stats)
+        report = stats.report()
+        self.assertEqual(len(report), 3)
+        slowest = report[0]
+        self.assertEqual(slowest['name'], __name__ + '.Thing')
+        self.assertEqual(slowest['tag'], 'x')
+        self.assertEqual(slowest['calls'], 2)
+        self.assertGreaterEqual(slowest['wall_time'], 0.04)
+        self.assertEqual(slowest['exceptions'], 0)
+        names_and_tags = {(stat['name'], stat['tag']) for stat in report[1:]}
+        self.assertEqual(names_and_tags, {
+            (__name__ + '.Thing.method', 'x'),
+            (__name__ + '.Thing.method', 'y'),
+        })
+        self.assertEqual(len(stats.report(1)), 1)
+        self.assertEqual(json.loads(stats.to_json()), report)
+
+    def test_stats_with_exception(self):
+        register_action(ThingWithLongerName, self.bad, _registry=self.registry)
+        stats = ActionStats()
+        with self.assertRaises(ValueError):
+            fire_actions(ThingWithLongerName, stats=stats, _registry=self.registry)
+        report = stats.report()
+        self.assertEqual(report[0]['calls'], 1)
+        self.assertEqual(report[0]['exceptions'], 1)
+
+    def test_stats_with_executor(self):
+        with ThreadPoolExecutor(2) as executor:
+            stats = fire_actions(
+                Thing, executor=executor, stats=True, _registry=self.registry)
+        self.assertEqual(len(stats), 3)
+
+    def test_stats_async(self):
+        async def sleepy():
+            await asyncio.sleep(0.02)
+
+        register_action(ThingWithLongerName, sleepy, _registry=self.registry)
+        coro = fire_actions_async(ThingWithLongerName, stats=True, _registry=self.registry)
+        stats = asyncio.run(coro)
+        report = stats.report()
+        self.assertEqual(len(report), 1)
+        self.assertGreaterEqual(report[0]['wall_time'], 0.02)
+
+
+class TestFireActionsOnce(unittest.TestCase):
+
+    def test_fire_actions_once(self):
+        registry = ActionRegistry()
+        fired = []
+        register_action(Thing, lambda: fired.append('a'), _registry=registry)
+        register_action(Thing, lambda: fired.append('b'), _registry=registry)
+        fire_actions(Thing, once=True, _registry=registry)
+        fire_actions(Thing, once=True, _registry=registry)
+        self.assertEqual(fired, ['a', 'b'])
+        register_action(Thing.method, lambda: fired.append('c'), _registry=registry)
+        fire_actions(Thing, once=True, _registry=registry)
+        self.assertEqual(fired, ['a', 'b', 'c'])
+        # Not in once mode, so everything is fired
+        fire_actions(Thing, _registry=registry)
+        self.assertEqual(fired, ['a', 'b', 'c', 'a', 'b', 'c'])
+
+
+class TestWatchActions(unittest.TestCase):
+
+    package_name = 'tangled_test_watch_actions'
+
+    action_module = (
+        'from tangled.decorators import register_action\n'
+        'from {dots} import fired\n'
+        'def func(): pass\n'
+        'register_action(func, lambda: fired.append({name!r}), tag="watch_test")\n'
+    )
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        package_dir = os.path.join(self.temp_dir.name, self.package_name)
+        os.makedirs(os.path.join(package_dir, 'plugins'))
+        files = {
+            '__init__.py': 'fired = []\n',
+            'core.py': self.action_module.format(dots='.', name='core'),
+            'plugins/__init__.py': '',
+            'plugins/a.py': self.action_module.format(dots='..', name='a'),
+            'plugins/b.py': self.action_module.format(dots='..', name='b'),
+        }
+        for name, content in files.items():
+            with open(os.path.join(package_dir, name), 'w') as fp:
+                fp.write(content)
+        sys.path.insert(0, self.temp_dir.name)
+
+    def tearDown(self):
+        sys.path.remove(self.temp_dir.name)
+        for name in list(sys.modules):
+            if name.split('.')[0] == self.package_name:
+                del sys.modules[name]
+        self.temp_dir.cleanup()
+
+    def test_watch_actions(self):
+        package_name = self.package_name
+        package = __import__(package_name)
+        fire_actions(package_name + '.core', tags='watch_test', once=True)
+        self.assertEqual(package.fired, ['core'])
+
+        with watch_actions(package_name, tags='watch_test') as hook:
+            self.assertIn(hook, sys.meta_path)
+            __import__(package_name + '.plugins.a')
+            self.assertEqual(package.fired, ['core', 'a'])
+        self.assertNotIn(hook, sys.meta_path)
+
+        fire_actions(package_name, tags='watch_test', once=True)
+        self.assertEqual(package.fired, ['core', 'a', 'b'])
+
+    def test_fire_actions_with_import_times(self):
+        package_name = self.package_name
+        import_times = {}
+        registry = ActionRegistry()
+        with action_registry(registry):
+            fire_actions(package_name, tags='watch_test', import_times=import_times)
+        self.assertEqual(list(import_times), [
+            package_name + '.core',
+            package_name + '.plugins',
+            package_name + '.plugins.a',
+            package_name + '.plugins.b',
+        ])
+        for import_time in import_times.values():
+            self.assertGreaterEqual(import_time, 0)
+
+
+class TestFireActionsInPackage(unittest.TestCase):
+
+    expected = [
+        ('tangled.tests.dummy_package.handlers', 'handle'),
+        ('tangled.tests.dummy_package.routes', 'route'),
+        ('tangled.tests.dummy_package.sub.handlers', 'handler'),
+        ('tangled.tests.dummy_package.views', 'view'),
+    ]
+
+    def setUp(self):
+        dummy_fired.clear()
+
+    def test_fire_actions(self):
+        fire_actions('tangled.tests.dummy_package', tags='dummy')
+        self.assertEqual(sorted(dummy_fired), self.expected)
+
+    def test_fire_actions_with_scan(self):
+        fire_actions('tangled.tests.dummy_package', tags='dummy', scan=True)
+        self.assertEqual(sorted(dummy_fired), self.expected)
+
+    def test_fire_actions_with_prefetch(self):
+        fire_actions('tangled.tests.dummy_package', tags='dummy', prefetch=True)
+        self.assertEqual(sorted(dummy_fired), self.expected)
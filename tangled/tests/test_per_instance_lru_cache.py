@@ -547,3 +547,100 @@ class TestPerInstanceLRUCache(unittest.TestCase):
                 f_copy = copy.deepcopy(f)
                 self.assertIs(f_copy, f)
 
+    def test_replay(self):
+        class C:
+
+            @per_instance_lru_cache(replay=True)
+            def rows(self, n):
+                nonlocal produced
+                for i in range(n):
+                    produced += 1
+                    yield i
+
+        instance = C()
+        produced = 0
+
+        first = instance.rows(3)
+        self.assertEqual(next(first), 0)
+        self.assertEqual(produced, 1)
+
+        # A second consumer replays the buffer then pulls from the source
+        self.assertEqual(list(instance.rows(3)), [0, 1, 2])
+        self.assertEqual(produced, 3)
+
+        # The first consumer continues from where it left off
+        self.assertEqual(list(first), [1, 2])
+        self.assertEqual(list(instance.rows(3)), [0, 1, 2])
+        self.assertEqual(produced, 3)
+
+        self.assertEqual(
+            C.rows.cache_info(instance),
+            functools._CacheInfo(hits=2, misses=1, maxsize=128, currsize=1))
+
+        # Different args produce a separate stream
+        self.assertEqual(list(instance.rows(2)), [0, 1])
+        self.assertEqual(produced, 5)
+
+    def test_replay_is_lazy(self):
+        class C:
+
+            @per_instance_lru_cache(replay=True)
+            def numbers(self):
+                i = 0
+                while True:
+                    yield i
+                    i += 1
+
+        instance = C()
+        stream = instance.numbers()
+        self.assertEqual([next(stream) for _ in range(5)], [0, 1, 2, 3, 4])
+        stream = instance.numbers()
+        self.assertEqual([next(stream) for _ in range(7)], [0, 1, 2, 3, 4, 5, 6])
+
+    def test_replay_with_exception(self):
+        class C:
+
+            @per_instance_lru_cache(replay=True)
+            def rows(self):
+                yield 1
+                raise ValueError('bad row')
+
+        instance = C()
+        for _ in range(2):
+            stream = instance.rows()
+            self.assertEqual(next(stream), 1)
+            with self.assertRaises(ValueError):
+                next(stream)
+
+    @unittest.skipUnless(threading, 'This test requires threading.')
+    def test_replay_threaded(self):
+        n, m = 5, 1000
+
+        class C:
+
+            @per_instance_lru_cache(replay=True)
+            def rows(self):
+                nonlocal produced
+                for i in range(m):
+                    produced += 1
+                    yield i
+
+        instance = C()
+        produced = 0
+        results = [None] * n
+        start = threading.Event()
+
+        def consume(k):
+            start.wait(10)
+            results[k] = list(instance.rows())
+
+        threads = [threading.Thread(target=consume, args=[k]) for k in range(n)]
+        for thread in threads:
+            thread.start()
+        start.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(produced, m)
+        for result in results:
+            self.assertEqual(result, list(range(m)))
@@ -1,7 +1,31 @@
+import gc
+import os
+import sys
+import tempfile
+import threading
 import unittest
+import weakref
+from collections.abc import Mapping
+from unittest import mock
 
 
-from tangled.registry import Registry
+from tangled import registry as registry_module
+from tangled.abcs import ACommand
+from tangled.registry import (
+    ChildRegistry,
+    CopyOnWriteRegistry,
+    FrozenRegistry,
+    LazyComponent,
+    ARegistry,
+    Registry,
+    RegistryStats,
+    component_scope,
+    get_process_registry,
+    load_snapshot,
+    prepare_for_fork,
+    save_snapshot,
+)
+from tangled.util import as_bool, load_object
 
 
 class TestRegistry(unittest.TestCase):
@@ -72,16 +96,60 @@ class TestRegistry(unittest.TestCase):
         self.registry.register(object, object(), 1)
         self.registry.register(object, object(), 2)
         components = self.registry.get_all(object, as_dict=True)
-        self.assertIsInstance(components, dict)
+        self.assertIsInstance(components, Mapping)
         self.assertIn(1, components)
         self.assertIn(2, components)
 
+    def test_get_all_as_dict_is_read_only(self):
+        self.registry.register('single', object())
+        self.registry.register('multiple', object(), 1)
+        self.registry.register('multiple', object(), 2)
+        for key in ('single', 'multiple'):
+            components = self.registry.get_all(key, as_dict=True)
+            self.assertIsInstance(components, Mapping)
+            with self.assertRaises(TypeError):
+                components[3] = object()
+
     def test_has_any(self):
         self.assertFalse(self.registry.has_any(object))
         self.registry.register(object, object(), 1)
         self.registry.register(object, object(), 2)
         self.assertTrue(self.registry.has_any(object))
 
+    def test_get_required(self):
+        component = object()
+        self.registry.register(object, component, 1)
+        self.assertIs(self.registry.get_required(object, 1), component)
+        with self.assertRaises(KeyError) as cm:
+            self.registry.get_required(object)
+        self.assertEqual(cm.exception.args, ([object, None],))
+        with self.assertRaises(KeyError):
+            self.registry.get_required('not registered')
+
+    def test_len(self):
+        self.assertEqual(len(self.registry), 0)
+        self.registry.register(object, object(), 1)
+        self.registry.register(object, object(), 2)
+        self.registry.register('key', object())
+        self.assertEqual(len(self.registry), 3)
+
+    def test_iter(self):
+        self.registry.register(object, object(), 1)
+        self.registry.register('key', object())
+        self.assertEqual(list(self.registry), [[object, 1], ['key', None]])
+
+    def test_subclass_without_init(self):
+        class SubRegistry(Registry):
+
+            def __init__(self):
+                pass
+
+        registry = SubRegistry()
+        registry.register(object, 1)
+        self.assertEqual(registry.get(object), 1)
+        with self.assertRaises(AttributeError):
+            registry.nonexistent_attribute
+
     def test_remove(self):
         with self.assertRaises(KeyError):
             self.registry.remove(object)
@@ -90,3 +158,936 @@ class TestRegistry(unittest.TestCase):
         self.registry.remove(object, 1)
         self.assertNotIn([object, 1], self.registry)
         self.assertIn([object, 2], self.registry)
+
+    def test_get_by_type(self):
+        class A:
+            pass
+
+        class B(A):
+            pass
+
+        class C(B):
+            pass
+
+        class D:
+            pass
+
+        self.registry.register(A, 'a')
+        self.registry.register(A, 'a1', 1)
+        self.assertEqual(self.registry.get_by_type(A), 'a')
+        self.assertEqual(self.registry.get_by_type(C), 'a')
+        self.assertEqual(self.registry.get_by_type(C, 1), 'a1')
+        self.assertIsNone(self.registry.get_by_type(C, 2))
+        self.assertIsNone(self.registry.get_by_type(D))
+        self.assertEqual(self.registry.get_by_type(D, default='default'), 'default')
+        # Registering a more specific component invalidates the cache
+        self.registry.register(B, 'b')
+        self.assertEqual(self.registry.get_by_type(C), 'b')
+        self.assertEqual(self.registry.get_by_type(A), 'a')
+        self.registry.remove(B)
+        self.assertEqual(self.registry.get_by_type(C), 'a')
+
+    def test_get_by_type_object(self):
+        self.registry.register(object, 'object')
+        self.assertEqual(self.registry.get_by_type(int), 'object')
+        self.registry.register(int, 'int')
+        self.assertEqual(self.registry.get_by_type(bool), 'int')
+
+    def test_get_by_type_does_not_keep_types_alive(self):
+        self.registry.register(object, 'object')
+        cls = type('Dynamic', (), {})
+        self.assertEqual(self.registry.get_by_type(cls), 'object')
+        ref = weakref.ref(cls)
+        del cls
+        gc.collect()
+        self.assertIsNone(ref())
+
+    def test_compact_storage(self):
+        self.registry.register('key', 'a')
+        self.assertIsInstance(self.registry._components['key'], tuple)
+        self.registry.register('key', 'A', replace=True)
+        self.assertIsInstance(self.registry._components['key'], tuple)
+        self.assertEqual(self.registry.get('key'), 'A')
+        self.assertIsNone(self.registry.get('key', 1))
+        self.assertEqual(self.registry.get_all('key'), ('A',))
+        self.assertEqual(dict(self.registry.get_all('key', as_dict=True)), {None: 'A'})
+        self.registry.register('key', 'b', 1)
+        self.assertNotIsInstance(self.registry._components['key'], tuple)
+        self.assertEqual(self.registry.get_all('key'), ('A', 'b'))
+        self.assertEqual(list(self.registry), [['key', None], ['key', 1]])
+        self.assertEqual(len(self.registry), 2)
+
+    def test_remove_single_component(self):
+        self.registry.register('key', 'a')
+        self.assertRaises(KeyError, self.registry.remove, 'key', 1)
+        self.registry.remove('key')
+        self.assertFalse(self.registry.contains('key'))
+        self.assertTrue(self.registry.has_any('key'))
+        self.assertEqual(self.registry.get_all('key'), ())
+        self.assertEqual(len(self.registry), 0)
+        self.registry.register('key', 'b')
+        self.assertIsInstance(self.registry._components['key'], tuple)
+        self.assertEqual(self.registry.get_all('key'), ('b',))
+
+    def test_remove_restores_compact_storage(self):
+        self.registry.register('key', 'a')
+        self.registry.register('key', 'b', 1)
+        self.registry.remove('key')
+        self.assertEqual(self.registry._components['key'], (1, 'b'))
+        self.assertEqual(self.registry.get_all('key'), ('b',))
+
+    def test_unhashable_differentiator(self):
+        self.assertRaises(TypeError, self.registry.register, 'key', 'a', [])
+
+    def test_register_many(self):
+        events = []
+        self.registry.subscribe(events.append)
+        version = self.registry.version
+        self.registry.register_many([('a', 1), ('b', 2, 'x'), ('b', 3, 'y'), ('a', 4, 'z')])
+        self.assertEqual(self.registry.get('a'), 1)
+        self.assertEqual(self.registry.get_all('b'), (2, 3))
+        self.assertEqual(self.registry.get_all('a'), (1, 4))
+        self.assertEqual(self.registry.version, version + 4)
+        self.assertEqual(len(events), 1)
+        versions = [event.version for event in events[0]]
+        self.assertEqual(versions, list(range(version + 1, version + 5)))
+
+    def test_register_many_conflicts(self):
+        self.registry.register('a', 1)
+        with self.assertRaises(KeyError) as context:
+            self.registry.register_many([('b', 2), ('a', 3), ('c', 4), ('c', 5)])
+        message = context.exception.args[0]
+        self.assertIn('[a, None]', message)
+        self.assertIn('[c, None]', message)
+        # Nothing was registered
+        self.assertEqual(list(self.registry), [['a', None]])
+        self.registry.register_many([('a', 3), ('c', 4), ('c', 5)], replace=True)
+        self.assertEqual(self.registry.get('a'), 3)
+        self.assertEqual(self.registry.get('c'), 5)
+
+    def test_register_many_unhashable(self):
+        self.assertRaises(TypeError, self.registry.register_many, [('a', 1), ('b', 2, [])])
+        self.assertEqual(len(self.registry), 0)
+
+    def test_register_many_updates_indexes(self):
+        self.registry.add_index('differentiator')
+        self.registry.register_many([('a', 1, 'x'), ('b', 2, 'x'), ('c', 3)])
+        self.assertEqual(self.registry.query('differentiator', 'x'), (1, 2))
+
+    def test_register_lazy(self):
+        self.registry.register_lazy('key', 'tangled.util:load_object')
+        placeholder = self.registry._components['key'][1]
+        self.assertIsInstance(placeholder, LazyComponent)
+        self.assertTrue(self.registry.contains('key'))
+        self.assertIs(self.registry.get('key'), load_object)
+        self.assertIs(self.registry._components['key'][1], load_object)
+        self.assertIs(self.registry.get_required('key'), load_object)
+
+    def test_register_lazy_get_all_and_freeze(self):
+        self.registry.register_lazy('key', 'tangled.util:load_object', 1)
+        self.registry.register_lazy('key', 'tangled.util:as_bool', 2)
+        self.assertEqual(self.registry.get_all('key'), (load_object, as_bool))
+        self.registry.register_lazy('other', 'tangled.util:as_bool')
+        frozen = self.registry.freeze()
+        self.assertIs(frozen.get('other'), as_bool)
+        self.assertIs(self.registry._components['other'][1], as_bool)
+
+    def test_register_lazy_bad_path(self):
+        self.registry.register_lazy('key', 'tangled.util:does_not_exist')
+        self.assertRaises(AttributeError, self.registry.get, 'key')
+
+    def test_register_lazy_get_all_only_loads_once(self):
+        self.registry.register('key', 1, 1)
+        self.assertNotIn('key', self.registry._lazy_keys)
+        self.registry.register_lazy('key', 'tangled.util:as_bool', 2)
+        self.assertIn('key', self.registry._lazy_keys)
+        self.assertEqual(self.registry.get_all('key'), (1, as_bool))
+        self.assertNotIn('key', self.registry._lazy_keys)
+
+    def test_register_many_lazy_get_all(self):
+        self.registry.register_many([('key', LazyComponent('tangled.util:as_bool'), 1)])
+        self.assertEqual(self.registry.get_all('key'), (as_bool,))
+
+    def test_register_lazy_get_all_bad_path(self):
+        self.registry.register_lazy('key', 'tangled.util:does_not_exist')
+        self.assertRaises(AttributeError, self.registry.get_all, 'key')
+        self.assertRaises(AttributeError, self.registry.get_all, 'key')
+
+    def test_subscribe(self):
+        events = []
+        subscription = self.registry.subscribe(events.append)
+        version = self.registry.version
+        component = object()
+        self.registry.register('key', component, 1)
+        self.registry.remove('key', 1)
+        self.assertEqual(len(events), 2)
+        (register_event,), (remove_event,) = events
+        self.assertEqual(register_event, ('register', 'key', 1, component, version + 1))
+        self.assertEqual(remove_event, ('remove', 'key', 1, component, version + 2))
+        self.registry.unsubscribe(subscription)
+        self.registry.register('key', component)
+        self.assertEqual(len(events), 2)
+
+    def test_subscribe_to_key(self):
+        events = []
+        self.registry.subscribe(events.append, key='key')
+        self.registry.register('other', object())
+        self.registry.register('key', object())
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0][0].key, 'key')
+
+    def test_batch(self):
+        all_events = []
+        key_events = []
+        self.registry.subscribe(all_events.append)
+        self.registry.subscribe(key_events.append, key='key')
+        with self.registry.batch():
+            with self.registry.batch():
+                self.registry.register('key', 1, 1)
+                self.registry.register('key', 2, 2)
+            self.registry.register('other', 3)
+            self.assertEqual(all_events, [])
+        self.assertEqual(len(all_events), 1)
+        self.assertEqual([event.component for event in all_events[0]], [1, 2, 3])
+        self.assertEqual(len(key_events), 1)
+        self.assertEqual([event.component for event in key_events[0]], [1, 2])
+        versions = [event.version for event in all_events[0]]
+        self.assertEqual(versions, sorted(versions))
+        self.assertEqual(versions[-1], self.registry.version)
+
+    def test_batch_is_per_thread(self):
+        events = []
+        self.registry.subscribe(events.append)
+        with self.registry.batch():
+            self.registry.register('key', 1)
+            thread = threading.Thread(target=self.registry.register, args=('other', 2))
+            thread.start()
+            thread.join()
+            self.assertEqual([[event.key for event in batch] for batch in events], [['other']])
+        self.assertEqual(
+            [[event.key for event in batch] for batch in events], [['other'], ['key']])
+
+    def test_subscriber_can_write(self):
+        def callback(events):
+            if events[0].key == 'key':
+                self.registry.register('derived', events[0].component)
+
+        self.registry.subscribe(callback)
+        self.registry.register('key', 1)
+        self.assertEqual(self.registry.get('derived'), 1)
+
+    def test_query_by_differentiator(self):
+        self.registry.register('a', 1, 'x')
+        self.registry.add_index('differentiator')
+        self.registry.register('b', 2, 'x')
+        self.registry.register('c', 3, 'y')
+        self.assertEqual(self.registry.query('differentiator', 'x'), (1, 2))
+        self.assertEqual(self.registry.query('differentiator', 'y'), (3,))
+        self.assertEqual(self.registry.query('differentiator', 'z'), ())
+        self.assertEqual(
+            dict(self.registry.query('differentiator', 'x', as_dict=True)),
+            {('a', 'x'): 1, ('b', 'x'): 2})
+        self.registry.remove('a', 'x')
+        self.assertEqual(self.registry.query('differentiator', 'x'), (2,))
+
+    def test_query_by_key_type(self):
+        self.registry.add_index('key_type')
+        self.registry.register('a', 1)
+        self.registry.register(int, 2)
+        self.registry.register(str, 3)
+        self.assertEqual(self.registry.query('key_type', str), (1,))
+        self.assertEqual(self.registry.query('key_type', type), (2, 3))
+
+    def test_query_with_custom_extractor(self):
+        self.registry.add_index('size', lambda key, differentiator, component: len(component))
+        self.registry.register('a', 'x')
+        self.registry.register('b', 'yy')
+        self.registry.register('c', 'z')
+        self.assertEqual(self.registry.query('size', 1), ('x', 'z'))
+        self.registry.register('c', 'zz', replace=True)
+        self.assertEqual(self.registry.query('size', 1), ('x',))
+        self.assertEqual(self.registry.query('size', 2), ('yy', 'zz'))
+
+    def test_query_unknown_index(self):
+        self.assertRaises(KeyError, self.registry.query, 'nope', 1)
+        self.assertRaises(ValueError, self.registry.add_index, 'nope')
+        self.registry.add_index('differentiator')
+        self.registry.remove_index('differentiator')
+        self.assertRaises(KeyError, self.registry.query, 'differentiator', None)
+
+
+class TestCopyOnWriteRegistry(TestRegistry):
+
+    def setUp(self):
+        self.registry = CopyOnWriteRegistry()
+
+    def test_get_all_as_dict_is_snapshot(self):
+        self.registry.register(object, 1, 1)
+        components = self.registry.get_all(object, as_dict=True)
+        self.registry.register(object, 2, 2)
+        self.assertEqual(dict(components), {1: 1})
+        self.assertEqual(self.registry.get_all(object), (1, 2))
+
+    def test_lazy_load_does_not_modify_snapshot(self):
+        self.registry.register_lazy('key', 'tangled.util:as_bool', 1)
+        self.registry.register_lazy('key', 'tangled.util:load_object', 2)
+        self.registry.register_lazy('other', 'tangled.util:as_bool')
+        snapshot = self.registry._components
+        components = snapshot['key']
+        self.assertIs(self.registry.get('other'), as_bool)
+        self.assertEqual(self.registry.get_all('key'), (as_bool, load_object))
+        self.assertIsNot(self.registry._components, snapshot)
+        self.assertIs(snapshot['key'], components)
+        self.assertIsInstance(snapshot['other'][1], LazyComponent)
+        self.assertIsInstance(components[1], LazyComponent)
+        self.assertIsInstance(components[2], LazyComponent)
+
+    def test_iteration_during_write(self):
+        for i in range(10):
+            self.registry.register(i, i)
+        keys = []
+        for key, differentiator in self.registry:
+            keys.append(key)
+            self.registry.register('new-{}'.format(key), key)
+        self.assertEqual(keys, list(range(10)))
+        self.assertEqual(len(self.registry), 20)
+
+    def test_already_registered(self):
+        self.registry.register(object, 1)
+        with self.assertRaises(KeyError):
+            self.registry.register(object, 2)
+        self.registry.register(object, 2, replace=True)
+        self.assertEqual(self.registry.get(object), 2)
+
+    def test_concurrent_reads_and_writes(self):
+        registry = self.registry
+        num_writers, num_keys = 4, 200
+        start = threading.Event()
+        errors = []
+
+        def write(n):
+            start.wait(10)
+            for i in range(num_keys):
+                registry.register((n, i), i)
+
+        def read():
+            start.wait(10)
+            try:
+                while len(registry) < num_writers * num_keys:
+                    for key, differentiator in registry:
+                        registry.get_required(key, differentiator)
+            except Exception as exc:
+                errors.append(exc)
+
+        threads = [threading.Thread(target=write, args=(n,)) for n in range(num_writers)]
+        threads += [threading.Thread(target=read) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        start.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(registry), num_writers * num_keys)
+        for n in range(num_writers):
+            for i in range(num_keys):
+                self.assertEqual(registry.get((n, i)), i)
+
+
+class TestChildRegistry(TestRegistry):
+
+    def setUp(self):
+        self.parent = Registry()
+        self.registry = self.parent.child()
+
+    def test_child(self):
+        self.assertIsInstance(self.registry, ChildRegistry)
+        self.assertIs(self.registry.parent, self.parent)
+
+    def test_version(self):
+        version = self.registry.version
+        self.registry.register('key', 1)
+        self.assertEqual(self.registry.version, version + 1)
+        self.registry.remove('key')
+        self.assertEqual(self.registry.version, version + 2)
+
+    def test_fallback_to_parent(self):
+        component = object()
+        self.parent.register('key', component, 1)
+        self.assertIs(self.registry.get('key', 1), component)
+        self.assertIs(self.registry.get_required('key', 1), component)
+        self.assertIs(self.registry[['key', 1]], component)
+        self.assertTrue(self.registry.contains('key', 1))
+        self.assertTrue(self.registry.has_any('key'))
+        self.assertIsNone(self.registry.get('key', 2))
+        self.assertRaises(KeyError, self.registry.get_required, 'key', 2)
+        self.assertEqual(len(self.parent), 1)
+        self.assertEqual(len(self.registry), 1)
+
+    def test_fallback_to_grandparent(self):
+        component = object()
+        grandchild = self.registry.child()
+        self.assertIsNone(grandchild.get('key'))
+        self.parent.register('key', component)
+        self.assertIs(grandchild.get('key'), component)
+
+    def test_shadow_parent(self):
+        parent_component = object()
+        component = object()
+        self.parent.register('key', parent_component)
+        self.registry.register('key', component)
+        self.assertIs(self.registry.get('key'), component)
+        self.assertIs(self.parent.get('key'), parent_component)
+        self.registry.remove('key')
+        self.assertIs(self.registry.get('key'), parent_component)
+
+    def test_cannot_remove_from_parent(self):
+        self.parent.register('key', object())
+        self.assertRaises(KeyError, self.registry.remove, 'key')
+        self.assertTrue(self.parent.contains('key'))
+
+    def test_parent_changes_invalidate_cache(self):
+        grandchild = self.registry.child()
+        self.assertIsNone(grandchild.get('key'))
+        component = object()
+        self.parent.register('key', component)
+        self.assertIs(grandchild.get('key'), component)
+        self.assertIs(grandchild.get('key'), component)
+        new_component = object()
+        self.parent.register('key', new_component, replace=True)
+        self.assertIs(grandchild.get('key'), new_component)
+        self.registry.register('key', component)
+        self.assertIs(grandchild.get('key'), component)
+        self.registry.remove('key')
+        self.parent.remove('key')
+        self.assertIsNone(grandchild.get('key'))
+
+    def test_cache_is_bounded(self):
+        self.registry.cache_size = 2
+        for i in range(3):
+            self.parent.register(i, i)
+        for i in range(3):
+            self.assertEqual(self.registry.get(i), i)
+        self.assertIsNone(self.registry.get('missing'))
+        self.assertEqual(list(self.registry._cache), [(2, None), ('missing', None)])
+
+    def test_concurrent_reads_with_eviction(self):
+        registry = self.registry
+        registry.cache_size = 4
+        num_keys = 64
+        for i in range(num_keys):
+            self.parent.register(i, i)
+        start = threading.Event()
+        errors = []
+
+        def read(n):
+            start.wait(10)
+            try:
+                for _ in range(200):
+                    for i in range(num_keys):
+                        key = (i + n) % num_keys
+                        self.assertEqual(registry.get_required(key), key)
+            except Exception as exc:
+                errors.append(exc)
+
+        # Switch threads often to make evictions race
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            threads = [threading.Thread(target=read, args=(n,)) for n in range(8)]
+            for thread in threads:
+                thread.start()
+            start.set()
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.setswitchinterval(switch_interval)
+
+        self.assertEqual(errors, [])
+
+    def test_cache_disabled(self):
+        self.registry.cache_size = 0
+        self.parent.register('key', 1)
+        self.assertEqual(self.registry.get('key'), 1)
+        self.assertEqual(self.registry._cache, {})
+
+    def test_ancestors(self):
+        grandchild = self.registry.child()
+        self.assertIsNone(self.parent.parent)
+        self.assertEqual(grandchild._ancestors, (self.registry, self.parent))
+
+    def test_get_all_merges_parent(self):
+        component1 = object()
+        component2 = object()
+        component3 = object()
+        self.parent.register('key', object(), 1)
+        self.parent.register('key', component2, 2)
+        self.registry.register('key', component1, 1)
+        self.registry.register('key', component3, 3)
+        self.assertEqual(self.registry.get_all('key'), (component1, component2, component3))
+        components = self.registry.get_all('key', as_dict=True)
+        self.assertEqual(list(components), [1, 2, 3])
+        self.assertIsNot(self.parent.get('key', 1), component1)
+
+    def test_get_by_type_sees_parent_changes(self):
+        class A:
+            pass
+
+        class B(A):
+            pass
+
+        self.parent.register(A, 'a')
+        self.assertEqual(self.registry.get_by_type(B), 'a')
+        self.parent.register(B, 'b')
+        self.assertEqual(self.registry.get_by_type(B), 'b')
+        self.registry.register(B, 'child b')
+        self.assertEqual(self.registry.get_by_type(B), 'child b')
+
+    def test_iter_and_freeze(self):
+        component1 = object()
+        component2 = object()
+        self.parent.register('key', object(), 1)
+        self.parent.register('key', component2, 2)
+        self.registry.register('key', component1, 1)
+        self.assertEqual(list(self.registry), [['key', 2], ['key', 1]])
+        self.assertEqual(len(self.registry), 2)
+        frozen = self.registry.freeze()
+        self.assertIs(frozen.get('key', 1), component1)
+        self.assertIs(frozen.get('key', 2), component2)
+        self.assertEqual(len(frozen), 2)
+
+
+class TestInstrumentedRegistry(unittest.TestCase):
+
+    def test_not_instrumented_by_default(self):
+        registry = Registry()
+        self.assertIs(type(registry), Registry)
+        self.assertFalse(hasattr(registry, 'stats'))
+
+    def test_instrumented_class(self):
+        registry = Registry(instrumented=True)
+        self.assertIsInstance(registry, Registry)
+        self.assertIsNot(type(registry), Registry)
+        self.assertIs(type(Registry(instrumented=True)), type(registry))
+        self.assertIsInstance(registry.stats, RegistryStats)
+        self.assertIsInstance(CopyOnWriteRegistry(instrumented=True), CopyOnWriteRegistry)
+        child = ChildRegistry(registry, instrumented=True)
+        self.assertIsInstance(child, ChildRegistry)
+        self.assertIs(child.parent, registry)
+
+    def test_stats(self):
+        registry = Registry(instrumented=True)
+        registry.register('key', 1)
+        registry.register('key', 2, 'x')
+        for _ in range(3):
+            self.assertEqual(registry.get('key'), 1)
+        self.assertIsNone(registry.get('key', 'y'))
+        self.assertEqual(registry.get('missing', default=0), 0)
+        self.assertEqual(registry.get_required('key', 'x'), 2)
+        self.assertRaises(KeyError, registry.get_required, 'missing')
+        self.assertEqual(registry.get_all('key'), (1, 2))
+        self.assertIsNone(registry.get_all('missing'))
+        self.assertTrue(registry.contains('key'))
+        self.assertFalse(registry.has_any('missing'))
+        report = registry.stats.report()
+        self.assertEqual(report[0], {
+            'method': 'get',
+            'key': 'key',
+            'differentiator': None,
+            'calls': 3,
+            'hits': 3,
+            'misses': 0,
+        })
+        self.assertEqual(len(registry.stats), 9)
+        stats = {(stat['method'], stat['key'], stat['differentiator']): stat for stat in report}
+        self.assertEqual(stats[('get', 'key', 'y')]['misses'], 1)
+        self.assertEqual(stats[('get_required', 'missing', None)]['misses'], 1)
+        self.assertEqual(stats[('get_all', 'key', None)]['hits'], 1)
+        self.assertEqual(stats[('has_any', 'missing', None)]['misses'], 1)
+        self.assertEqual(len(registry.stats.report(2)), 2)
+        self.assertEqual(registry.stats.report(1, sort_by='misses')[0]['misses'], 1)
+        registry.stats.clear()
+        self.assertEqual(len(registry.stats), 0)
+
+    def test_child_get_required_counted_once(self):
+        child = ChildRegistry(Registry(), instrumented=True)
+        child.register('key', 1)
+        child.get_required('key')
+        self.assertEqual(len(child.stats), 1)
+        self.assertEqual(child.stats.report()[0]['method'], 'get_required')
+
+
+class TestRegistryOverlay(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = Registry()
+        self.registry.register('key', 'a', 1)
+        self.registry.register('key', 'b', 2)
+        self.registry.register('other', 'other')
+
+    def test_override(self):
+        with self.registry.overlay() as overlay:
+            overlay.register('key', 'A', 1)
+            overlay.register('key', 'c', 3)
+            self.assertEqual(self.registry.get('key', 1), 'A')
+            self.assertEqual(self.registry.get_required('key', 3), 'c')
+            self.assertEqual(self.registry.get('other'), 'other')
+            self.assertEqual(self.registry.get_all('key'), ('A', 'b', 'c'))
+            self.assertTrue(self.registry.contains('key', 3))
+            self.assertEqual(len(self.registry), 4)
+            self.assertEqual(
+                list(self.registry), [['key', 1], ['key', 2], ['other', None], ['key', 3]])
+        self.assertEqual(self.registry.get('key', 1), 'a')
+        self.assertIsNone(self.registry.get('key', 3))
+        self.assertEqual(self.registry.get_all('key'), ('a', 'b'))
+        self.assertEqual(len(self.registry), 3)
+
+    def test_remove(self):
+        with self.registry.overlay() as overlay:
+            overlay.remove('other')
+            self.assertIsNone(self.registry.get('other'))
+            self.assertRaises(KeyError, self.registry.get_required, 'other')
+            self.assertFalse(self.registry.contains('other'))
+            self.assertFalse(self.registry.has_any('other'))
+            self.assertEqual(len(self.registry), 2)
+            self.assertRaises(KeyError, overlay.remove, 'not registered')
+        self.assertEqual(self.registry.get('other'), 'other')
+
+    def test_nested(self):
+        with self.registry.overlay() as outer:
+            outer.register('key', 'A', 1)
+            with self.registry.overlay() as inner:
+                inner.register('key', 'B', 2)
+                self.assertEqual(self.registry.get_all('key'), ('A', 'B'))
+                inner.remove('key', 1)
+                self.assertEqual(self.registry.get_all('key'), ('B',))
+            self.assertEqual(self.registry.get_all('key'), ('A', 'b'))
+
+    def test_overlay_is_context_local(self):
+        results = []
+        with self.registry.overlay() as overlay:
+            overlay.register('other', 'overridden')
+            thread = threading.Thread(target=lambda: results.append(self.registry.get('other')))
+            thread.start()
+            thread.join()
+            self.assertEqual(self.registry.get('other'), 'overridden')
+        self.assertEqual(results, ['other'])
+
+    def test_other_registries_unaffected(self):
+        registry = Registry()
+        registry.register('other', 'other')
+        with self.registry.overlay() as overlay:
+            overlay.register('other', 'overridden')
+            self.assertEqual(registry.get('other'), 'other')
+
+    def test_get_by_type(self):
+        self.registry.register(object, 'object')
+        self.assertEqual(self.registry.get_by_type(int), 'object')
+        with self.registry.overlay() as overlay:
+            overlay.register(int, 'int')
+            self.assertEqual(self.registry.get_by_type(bool), 'int')
+        self.assertEqual(self.registry.get_by_type(bool), 'object')
+
+    def test_child_of_overlaid_registry(self):
+        child = self.registry.child()
+        self.assertEqual(child.get('other'), 'other')
+        with self.registry.overlay() as overlay:
+            overlay.register('other', 'overridden')
+            self.assertEqual(child.get('other'), 'overridden')
+        self.assertEqual(child.get('other'), 'other')
+
+    def test_overlay_child(self):
+        child = self.registry.child()
+        child.register('key', 'child c', 3)
+        with child.overlay() as overlay:
+            overlay.remove('key', 1)
+            overlay.register('key', 'd', 4)
+            self.assertEqual(child.get_all('key'), ('b', 'child c', 'd'))
+            self.assertEqual(self.registry.get_all('key'), ('a', 'b'))
+            self.assertEqual(len(child), 4)
+
+    def test_freeze(self):
+        with self.registry.overlay() as overlay:
+            overlay.register('other', 'overridden')
+            frozen = self.registry.freeze()
+        self.assertEqual(frozen.get('other'), 'overridden')
+        self.assertEqual(self.registry.freeze().get('other'), 'other')
+
+
+class TestComponentFactories(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = Registry()
+        self.disposed = []
+
+    def register(self, lifetime):
+        return self.registry.register_factory(
+            'key', object, lifetime=lifetime, dispose=self.disposed.append)
+
+    def resolve_in_thread(self):
+        instances = []
+        thread = threading.Thread(target=lambda: instances.append(self.registry.resolve('key')))
+        thread.start()
+        thread.join()
+        return instances[0]
+
+    def test_resolve_plain_component(self):
+        component = object()
+        self.registry.register('plain', component)
+        self.assertIs(self.registry.resolve('plain'), component)
+        self.assertIsNone(self.registry.resolve('not registered'))
+
+    def test_unknown_lifetime(self):
+        self.assertRaises(ValueError, self.register, 'forever')
+
+    def test_singleton(self):
+        factory = self.register('singleton')
+        self.assertIs(self.registry.get('key'), factory)
+        instance = self.registry.resolve('key')
+        self.assertIs(self.registry.resolve('key'), instance)
+        self.assertIs(self.resolve_in_thread(), instance)
+        self.registry.dispose_instances()
+        self.assertEqual(self.disposed, [instance])
+        self.assertIsNot(self.registry.resolve('key'), instance)
+
+    def test_singleton_is_created_once(self):
+        calls = []
+        barrier = threading.Barrier(8)
+
+        def factory():
+            calls.append(1)
+            return object()
+
+        def resolve():
+            barrier.wait()
+            instances.append(self.registry.resolve('key'))
+
+        self.registry.register_factory('key', factory)
+        instances = []
+        threads = [threading.Thread(target=resolve) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(set(map(id, instances))), 1)
+
+    def test_thread(self):
+        self.register('thread')
+        instance = self.registry.resolve('key')
+        self.assertIs(self.registry.resolve('key'), instance)
+        thread_instance = self.resolve_in_thread()
+        self.assertIsNot(thread_instance, instance)
+        # Disposed of when the thread exits
+        self.assertEqual(self.disposed, [thread_instance])
+        self.registry.dispose_instances()
+        self.assertEqual(self.disposed, [thread_instance, instance])
+
+    def test_context(self):
+        self.register('context')
+        self.assertRaises(LookupError, self.registry.resolve, 'key')
+        with component_scope():
+            instance = self.registry.resolve('key')
+            self.assertIs(self.registry.resolve('key'), instance)
+            with component_scope():
+                nested_instance = self.registry.resolve('key')
+                self.assertIsNot(nested_instance, instance)
+            self.assertEqual(self.disposed, [nested_instance])
+            self.assertIs(self.registry.resolve('key'), instance)
+        self.assertEqual(self.disposed, [nested_instance, instance])
+
+    def test_transient(self):
+        self.register('transient')
+        self.assertIsNot(self.registry.resolve('key'), self.registry.resolve('key'))
+        self.registry.dispose_instances()
+        self.assertEqual(self.disposed, [])
+
+    def test_resolve_from_frozen_registry(self):
+        self.register('singleton')
+        frozen = self.registry.freeze()
+        instance = frozen.resolve('key')
+        self.assertIs(self.registry.resolve('key'), instance)
+        frozen.dispose_instances()
+        self.assertEqual(self.disposed, [instance])
+
+
+class TestFrozenRegistry(unittest.TestCase):
+
+    def setUp(self):
+        registry = Registry()
+        self.component = object()
+        self.component1 = object()
+        self.component2 = object()
+        registry.register(object, self.component)
+        registry.register('key', self.component1, 1)
+        registry.register('key', self.component2, 2)
+        self.registry = registry
+        self.frozen = registry.freeze()
+
+    def test_freeze(self):
+        self.assertIsInstance(self.frozen, FrozenRegistry)
+        self.assertIs(self.frozen.freeze(), self.frozen)
+
+    def test_snapshot_is_independent(self):
+        self.registry.register('new', object())
+        self.registry.remove('key', 1)
+        self.assertFalse(self.frozen.has_any('new'))
+        self.assertTrue(self.frozen.contains('key', 1))
+
+    def test_get(self):
+        self.assertIs(self.frozen.get(object), self.component)
+        self.assertIs(self.frozen.get('key', 2), self.component2)
+        self.assertIsNone(self.frozen.get('key'))
+        self.assertEqual(self.frozen.get('not registered', default={}), {})
+
+    def test_get_required(self):
+        self.assertIs(self.frozen.get_required('key', 1), self.component1)
+        with self.assertRaises(KeyError):
+            self.frozen.get_required('key')
+
+    def test_get_item(self):
+        self.assertIs(self.frozen[object], self.component)
+        self.assertIs(self.frozen[['key', 1]], self.component1)
+        with self.assertRaises(KeyError):
+            self.frozen['not registered']
+
+    def test_get_all(self):
+        self.assertEqual(self.frozen.get_all('key'), (self.component1, self.component2))
+        self.assertIs(self.frozen.get_all('key'), self.frozen.get_all('key'))
+        self.assertIsNone(self.frozen.get_all('not registered'))
+        components = self.frozen.get_all('key', as_dict=True)
+        self.assertEqual(dict(components), {1: self.component1, 2: self.component2})
+        with self.assertRaises(TypeError):
+            components[3] = object()
+
+    def test_get_by_type(self):
+        self.assertIs(self.frozen.get_by_type(object), self.component)
+        self.assertIs(self.frozen.get_by_type(int), self.component)
+        self.assertIsNone(self.frozen.get_by_type(int, 1))
+
+    def test_contains(self):
+        self.assertTrue(self.frozen.contains('key', 1))
+        self.assertFalse(self.frozen.contains('key', 3))
+        self.assertIn([object, None], self.frozen)
+        self.assertTrue(self.frozen.has_any('key'))
+        self.assertFalse(self.frozen.has_any('not registered'))
+
+    def test_len_and_iter(self):
+        self.assertEqual(len(self.frozen), len(self.registry))
+        self.assertEqual(list(self.frozen), list(self.registry))
+
+    def test_read_only(self):
+        with self.assertRaises(TypeError):
+            self.frozen.register('new', object())
+        with self.assertRaises(TypeError):
+            self.frozen['new'] = object()
+        with self.assertRaises(TypeError):
+            self.frozen.remove('key', 1)
+        with self.assertRaises(TypeError):
+            del self.frozen[['key', 1]]
+
+
+class TestPrepareForFork(unittest.TestCase):
+
+    def tearDown(self):
+        gc.unfreeze()
+
+    def test_prepare_for_fork(self):
+        registry = Registry()
+        registry.register('key', 1)
+        registry.register_lazy('lazy', 'tangled.util:load_object')
+        frozen = prepare_for_fork(registry)
+        self.assertIsInstance(frozen, FrozenRegistry)
+        self.assertIs(frozen.get('lazy'), load_object)
+        self.assertGreater(gc.get_freeze_count(), 0)
+
+    def test_prepare_process_registry_for_fork(self):
+        process_registry = registry_module.process_registry
+        try:
+            frozen = prepare_for_fork()
+            self.assertIsInstance(frozen, FrozenRegistry)
+            self.assertIs(get_process_registry(), frozen)
+            self.assertIs(frozen.get(ARegistry), Registry)
+            # The process registry itself isn't replaced
+            self.assertIs(registry_module.process_registry, process_registry)
+            self.assertNotIsInstance(process_registry, FrozenRegistry)
+        finally:
+            registry_module._frozen_process_registry = None
+
+    def test_main_after_prepare_for_fork(self):
+        import tangled.__main__
+
+        class Command(ACommand):
+
+            @classmethod
+            def configure(cls, parser):
+                pass
+
+            def run(self):
+                return 'ran'
+
+        entry_point = mock.Mock(attrs=(), load=lambda: Command)
+        entry_point.name = 'test-command'
+        process_registry = registry_module.process_registry
+        try:
+            prepare_for_fork()
+            with mock.patch('pkg_resources.iter_entry_points', return_value=[entry_point]):
+                self.assertEqual(tangled.__main__.main(['test-command']), 'ran')
+            self.assertIs(process_registry.get(ACommand, 'test-command'), Command)
+        finally:
+            registry_module._frozen_process_registry = None
+            process_registry.remove(ACommand, 'test-command')
+
+
+class TestSnapshots(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.file_name = os.path.join(self.temp_dir.name, 'registry.json')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_save_and_load(self):
+        registry = Registry()
+        registry.register(ARegistry, Registry)
+        registry.register('load_object', load_object, 'x')
+        registry.register('module', registry_module)
+        registry.register('number', 1, 2)
+        registry.register_lazy('lazy', 'tangled.util:as_bool')
+        save_snapshot(registry, self.file_name)
+        self.assertIsInstance(registry._components['lazy'][1], LazyComponent)
+
+        loaded = load_snapshot(self.file_name)
+        self.assertEqual(list(loaded), list(registry))
+        self.assertIsInstance(loaded._components[ARegistry][1], LazyComponent)
+        self.assertIs(loaded.get(ARegistry), Registry)
+        self.assertIs(loaded.get('load_object', 'x'), load_object)
+        self.assertIs(loaded.get('module'), registry_module)
+        self.assertEqual(loaded.get('number', 2), 1)
+        self.assertIs(loaded.get('lazy'), as_bool)
+
+    def test_load_into_registry(self):
+        registry = Registry()
+        registry.register('key', 1)
+        save_snapshot(registry, self.file_name)
+        self.assertRaises(KeyError, load_snapshot, self.file_name, registry)
+        other = CopyOnWriteRegistry()
+        self.assertIs(load_snapshot(self.file_name, other), other)
+        self.assertEqual(other.get('key'), 1)
+
+    def test_save_frozen_registry(self):
+        registry = Registry()
+        registry.register(ARegistry, Registry)
+        save_snapshot(registry.freeze(), self.file_name)
+        self.assertIs(load_snapshot(self.file_name).get(ARegistry), Registry)
+
+    def test_cannot_save_instances(self):
+        registry = Registry()
+        registry.register('object', object())
+        registry.register('lambda', lambda: None)
+        with self.assertRaises(ValueError) as context:
+            save_snapshot(registry, self.file_name)
+        self.assertIn('[object, None]', str(context.exception))
+        self.assertIn('[lambda, None]', str(context.exception))
+        self.assertFalse(os.path.exists(self.file_name))
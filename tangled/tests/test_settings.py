@@ -1,3 +1,6 @@
+import os
+import shutil
+import tempfile
 import unittest
 
 
@@ -50,3 +53,146 @@ class TestSettings(unittest.TestCase):
         }
         settings = tangled.settings.parse_settings(settings)
         self.assertEqual(settings, {'a': tangled.util.load_object})
+
+
+class TestParseSettingsFile(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        tangled.settings.clear_settings_cache()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+        tangled.settings.clear_settings_cache()
+
+    def write(self, name, contents):
+        file_name = os.path.join(self.dir, name)
+        with open(file_name, 'w') as fp:
+            fp.write(contents)
+        return file_name
+
+    def touch(self, file_name, contents):
+        # Ensure the mtime changes even on file systems with coarse
+        # timestamps.
+        mtime_ns = os.stat(file_name).st_mtime_ns
+        with open(file_name, 'w') as fp:
+            fp.write(contents)
+        os.utime(file_name, ns=(mtime_ns + 10 ** 9, mtime_ns + 10 ** 9))
+
+    def test_parse_settings_file(self):
+        file_name = self.write('test.ini', '[app]\na = 1\nb = [1, 2]\n')
+        settings = tangled.settings.parse_settings_file(file_name)
+        self.assertEqual(settings['a'], 1)
+        self.assertEqual(settings['b'], [1, 2])
+        self.assertEqual(settings['__file__'], file_name)
+        self.assertEqual(settings['env'], 'test')
+
+    def test_extends(self):
+        self.write('base.ini', '[app]\na = 1\nb = 2\n')
+        file_name = self.write('test.ini', '[app]\nextends = "base.ini"\nb = 3\n')
+        settings = tangled.settings.parse_settings_file(file_name)
+        self.assertEqual(settings['a'], 1)
+        self.assertEqual(settings['b'], 3)
+        self.assertEqual(settings['__base__'], os.path.join(self.dir, 'base.ini'))
+
+    def test_cached_settings_are_copies(self):
+        file_name = self.write('test.ini', '[app]\na = {"b": [1]}\n')
+        settings = tangled.settings.parse_settings_file(file_name)
+        settings['a']['b'].append(2)
+        settings['c'] = 3
+        settings = tangled.settings.parse_settings_file(file_name)
+        self.assertEqual(settings['a'], {'b': [1]})
+        self.assertNotIn('c', settings)
+
+    def test_cache_is_used(self):
+        file_name = self.write('test.ini', '[app]\na = 1\n')
+        tangled.settings.parse_settings_file(file_name)
+        original = tangled.settings._read_settings_file
+        tangled.settings._read_settings_file = None
+        try:
+            settings = tangled.settings.parse_settings_file(file_name)
+        finally:
+            tangled.settings._read_settings_file = original
+        self.assertEqual(settings['a'], 1)
+
+    def test_cache_is_keyed_by_options(self):
+        file_name = self.write('test.ini', '[app]\na = 1\n\n[other]\na = 2\n')
+        parse_settings_file = tangled.settings.parse_settings_file
+        self.assertEqual(parse_settings_file(file_name)['a'], 1)
+        self.assertEqual(parse_settings_file(file_name, 'other')['a'], 2)
+        self.assertEqual(parse_settings_file(file_name, extra={'a': 3})['a'], 3)
+        self.assertEqual(parse_settings_file(file_name, extra={'a': True})['a'], True)
+        self.assertNotIn('__file__', parse_settings_file(file_name, meta_settings=False))
+
+    def test_cache_is_invalidated_when_file_changes(self):
+        file_name = self.write('test.ini', '[app]\na = 1\n')
+        self.assertEqual(tangled.settings.parse_settings_file(file_name)['a'], 1)
+        self.touch(file_name, '[app]\na = 2\n')
+        self.assertEqual(tangled.settings.parse_settings_file(file_name)['a'], 2)
+
+    def test_cache_is_invalidated_when_base_file_changes(self):
+        base_file_name = self.write('base.ini', '[app]\na = 1\n')
+        file_name = self.write('test.ini', '[app]\nextends = "base.ini"\n')
+        self.assertEqual(tangled.settings.parse_settings_file(file_name)['a'], 1)
+        self.touch(base_file_name, '[app]\na = 2\n')
+        self.assertEqual(tangled.settings.parse_settings_file(file_name)['a'], 2)
+
+    def test_unhashable_options_are_not_cached(self):
+        file_name = self.write('test.ini', '[app]\na = 1\n')
+        settings = tangled.settings.parse_settings_file(file_name, extra={'b': bytearray()})
+        self.assertEqual(settings['a'], 1)
+        self.assertEqual(len(tangled.settings._settings_cache), 0)
+
+    def test_cache_disabled(self):
+        file_name = self.write('test.ini', '[app]\na = 1\n')
+        tangled.settings.parse_settings_file(file_name, cache=False)
+        self.assertEqual(len(tangled.settings._settings_cache), 0)
+
+    def test_base_files_are_parsed_once(self):
+        read = []
+        original = tangled.settings._read_settings_file
+
+        def read_settings_file(file_name, *args):
+            read.append(os.path.basename(file_name))
+            return original(file_name, *args)
+
+        self.write('base.ini', '[app]\na = 1\n')
+        self.write('shared.ini', '[app]\nextends = "./base.ini"\nb = 2\n')
+        development = self.write('development.ini', '[app]\nextends = "shared.ini"\nc = 3\n')
+        test = self.write('test.ini', '[app]\nextends = "shared.ini"\nc = 4\n')
+        tangled.settings._read_settings_file = read_settings_file
+        try:
+            development = tangled.settings.parse_settings_file(development)
+            test = tangled.settings.parse_settings_file(test)
+        finally:
+            tangled.settings._read_settings_file = original
+        self.assertEqual(read, ['development.ini', 'shared.ini', 'base.ini', 'test.ini'])
+        self.assertEqual((development['a'], development['b'], development['c']), (1, 2, 3))
+        self.assertEqual((test['a'], test['b'], test['c']), (1, 2, 4))
+        self.assertEqual(test['env'], 'test')
+        self.assertEqual(test['__bases__'], (
+            os.path.join(self.dir, 'shared.ini'),
+            os.path.join(self.dir, 'base.ini'),
+        ))
+
+    def test_extends_cycle(self):
+        self.write('a.ini', '[app]\nextends = "b.ini"\n')
+        file_name = self.write('b.ini', '[app]\nextends = "./a.ini"\n')
+        for cache in (True, False):
+            with self.assertRaises(ValueError) as context:
+                tangled.settings.parse_settings_file(file_name, cache=cache)
+            self.assertRegex(str(context.exception), r'b\.ini -> \S*a\.ini -> \S*b\.ini$')
+
+    def test_extends_self(self):
+        file_name = self.write('a.ini', '[app]\nextends = "a.ini"\n')
+        with self.assertRaises(ValueError) as context:
+            tangled.settings.parse_settings_file(file_name)
+        self.assertRegex(str(context.exception), r'a\.ini -> \S*a\.ini$')
+
+    def test_required_setting_in_base_file(self):
+        self.write('base.ini', '[app]\na = 1\n')
+        file_name = self.write('test.ini', '[app]\nextends = "base.ini"\nb = 2\n')
+        settings = tangled.settings.parse_settings_file(file_name, required=['a', 'b'])
+        self.assertEqual((settings['a'], settings['b']), (1, 2))
+        self.assertRaises(
+            ValueError, tangled.settings.parse_settings_file, file_name, required=['c'])
@@ -1,8 +1,11 @@
+import json
 import os
 import sys
+import tempfile
 import unittest
 
 from tangled import util
+from tangled.tests import dummy_package
 
 
 class Test_load_object(unittest.TestCase):
@@ -70,6 +73,18 @@ class Test_abs_path(unittest.TestCase):
         self.assertEqual(path, expected)
 
 
+class Test_atomic_write_json(unittest.TestCase):
+
+    def test_atomic_write_json(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_name = os.path.join(temp_dir, 'data.json')
+            util.atomic_write_json(file_name, {'a': 1})
+            util.atomic_write_json(file_name, {'b': [2]})
+            with open(file_name) as fp:
+                self.assertEqual(json.load(fp), {'b': [2]})
+            self.assertEqual(os.listdir(temp_dir), ['data.json'])
+
+
 class Test_get_items_with_key_prefix(unittest.TestCase):
 
     def test_get_items_with_key_prefix(self):
@@ -89,3 +104,107 @@ class Test_get_items_with_key_prefix(unittest.TestCase):
         items_with_prefix = util.get_items_with_key_prefix(items, 'a.')
         expected = [('a', 1), ('b', 2)]
         self.assertEqual(items_with_prefix, expected)
+
+
+class Test_iter_package_modules(unittest.TestCase):
+
+    def test_iter_package_modules(self):
+        names = [name for name, _ in util.iter_package_modules(dummy_package)]
+        self.assertEqual(names, [
+            'tangled.tests.dummy_package.decorators',
+            'tangled.tests.dummy_package.handlers',
+            'tangled.tests.dummy_package.plain',
+            'tangled.tests.dummy_package.routes',
+            'tangled.tests.dummy_package.sub',
+            'tangled.tests.dummy_package.sub.handlers',
+            'tangled.tests.dummy_package.views',
+        ])
+
+
+class Test_import_package(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.package_name = 'tangled_test_import_package'
+        package_dir = os.path.join(self.temp_dir.name, self.package_name)
+        os.makedirs(os.path.join(package_dir, 'sub'))
+        files = {
+            '__init__.py': '',
+            'a.py': 'from . import b\n',
+            'b.py': '',
+            'sub/__init__.py': '',
+            'sub/c.py': 'x = 1\n',
+        }
+        for name, content in files.items():
+            with open(os.path.join(package_dir, name), 'w') as fp:
+                fp.write(content)
+        sys.path.insert(0, self.temp_dir.name)
+
+    def tearDown(self):
+        sys.path.remove(self.temp_dir.name)
+        for name in list(sys.modules):
+            if name.split('.')[0] == self.package_name:
+                del sys.modules[name]
+        self.temp_dir.cleanup()
+
+    def _check(self, **kwargs):
+        package = util.load_object(self.package_name)
+        import_times = util.import_package(package, **kwargs)
+        names = ['.'.join((self.package_name, name)) for name in ('a', 'sub', 'sub.c')]
+        self.assertEqual(list(import_times), names)
+        for import_time in import_times.values():
+            self.assertGreaterEqual(import_time, 0)
+        self.assertIn(self.package_name + '.b', sys.modules)
+        self.assertEqual(sys.modules[self.package_name + '.sub.c'].x, 1)
+        self.assertEqual(util.import_package(package, **kwargs), {})
+
+    def test_import_package(self):
+        self._check()
+
+    def test_import_package_with_prefetch(self):
+        self._check(prefetch=True, max_workers=2)
+
+
+class Test_scan_package(unittest.TestCase):
+
+    expected = [
+        'tangled.tests.dummy_package.decorators',
+        'tangled.tests.dummy_package.handlers',
+        'tangled.tests.dummy_package.routes',
+        'tangled.tests.dummy_package.sub.handlers',
+        'tangled.tests.dummy_package.views',
+    ]
+
+    def test_scan_package(self):
+        names = util.scan_package(dummy_package, ['register_action'])
+        self.assertEqual(names, self.expected)
+
+    def test_scan_package_with_decorator_names(self):
+        names = util.scan_package(dummy_package, ['dummy_action'])
+        self.assertEqual(names, self.expected[3:])
+
+    def test_scan_package_with_class_based_decorator(self):
+        names = util.scan_package(dummy_package, ['dummy_route'])
+        self.assertEqual(names, ['tangled.tests.dummy_package.routes'])
+
+    def test_scan_package_with_assigned_decorator(self):
+        names = util.scan_package(dummy_package, ['make_dummy_decorator'])
+        self.assertEqual(names, [
+            'tangled.tests.dummy_package.decorators',
+            'tangled.tests.dummy_package.handlers',
+        ])
+
+    def test_scan_package_with_manifest(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            manifest = os.path.join(temp_dir, 'manifest.json')
+            names = util.scan_package(dummy_package, ['register_action'], manifest)
+            self.assertEqual(names, self.expected)
+            with open(manifest) as fp:
+                entries = json.load(fp)
+            self.assertEqual(len(entries), 7)
+            for entry in entries.values():
+                self.assertIn('mtime', entry)
+                self.assertIn('size', entry)
+            # Reusing the manifest should produce the same result
+            names = util.scan_package(dummy_package, ['register_action'], manifest)
+            self.assertEqual(names, self.expected)
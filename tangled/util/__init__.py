@@ -1,7 +1,8 @@
 import importlib
 import inspect
 
-from . import path, random
+from . import modules, path, random
+from .modules import *
 from .path import *
 from .random import *
 
@@ -14,7 +15,7 @@ __all__ = [
     'filter_items',
     'get_items_with_key_prefix',
     'load_object',
-] + path.__all__ + random.__all__
+] + modules.__all__ + path.__all__ + random.__all__
 
 
 NOT_SET = type('NOT_SET', (), {
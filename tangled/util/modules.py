@@ -0,0 +1,264 @@
+import ast
+import json
+import os
+import pkgutil
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from .path import atomic_write_json
+
+
+__all__ = [
+    'import_package',
+    'iter_package_modules',
+    'scan_package',
+]
+
+
+_MANIFEST_CACHE = {}
+
+# Incremented when the format or contents of module summaries change so
+# that summaries in existing manifests are recomputed.
+_SUMMARY_VERSION = 2
+
+
+def iter_package_modules(package):
+    """Find the modules in ``package`` *without* importing them.
+
+    Yields pairs of ``(module name, spec)`` for every module in the
+    package, recursing into subpackages. Unlike
+    :func:`pkgutil.walk_packages`, subpackages are not imported in order
+    to find their submodules.
+
+    """
+    yield from _iter_package_modules(package.__path__, package.__name__ + '.')
+
+
+def _iter_package_modules(path, prefix):
+    for finder, name, is_pkg in pkgutil.iter_modules(path, prefix):
+        spec = finder.find_spec(name)
+        if spec is None:
+            continue
+        yield name, spec
+        if is_pkg and spec.submodule_search_locations:
+            yield from _iter_package_modules(spec.submodule_search_locations, name + '.')
+
+
+def import_package(package, scan=None, manifest=None, prefetch=False, max_workers=None):
+    """Import all the modules in ``package``.
+
+    If ``scan`` is passed, it should be a list of names; only the
+    modules found by :func:`scan_package` will be imported (``manifest``
+    is passed through to it).
+
+    If ``prefetch`` is set, the source files of the modules will be read
+    and compiled (or their cached bytecode will be read) concurrently in
+    a thread pool with up to ``max_workers`` threads *before* the
+    modules are imported one by one in the usual order. This is useful
+    when most of the time spent importing is spent waiting on I/O, such
+    as when the disk cache is cold or the package is on a network file
+    system. No module code is executed in the thread pool.
+
+    Returns an ordered dict mapping the name of each module imported
+    here to the time in seconds it took to import, in import order.
+    Modules that were already imported (including those imported as a
+    side effect of importing an earlier module) aren't included. The
+    time for a module includes the time taken to import any modules it
+    imports.
+
+    """
+    if scan is not None:
+        module_names = scan_package(package, scan, manifest)
+        specs = None
+    else:
+        specs = list(iter_package_modules(package))
+        module_names = [name for name, _ in specs]
+
+    if prefetch:
+        if specs is None:
+            specs = iter_package_modules(package)
+        selected = set(module_names)
+        specs = [
+            spec for name, spec in specs
+            if name in selected and name not in sys.modules
+        ]
+        with ThreadPoolExecutor(max_workers) as executor:
+            for _ in executor.map(_prefetch_module, specs):
+                pass
+
+    timer = time.perf_counter
+    import_times = OrderedDict()
+    for name in module_names:
+        if name not in sys.modules:
+            start_time = timer()
+            __import__(name)
+            import_times[name] = timer() - start_time
+    return import_times
+
+
+def _prefetch_module(spec):
+    """Read module source and compile it to warm the bytecode cache.
+
+    For source files, :meth:`get_code` will read the cached bytecode if
+    it's up to date. Otherwise, it will compile the source and write the
+    bytecode to the cache. Errors are ignored here; they'll be raised
+    when the module is actually imported.
+
+    """
+    get_code = getattr(spec.loader, 'get_code', None)
+    if get_code is not None:
+        try:
+            get_code(spec.name)
+        except Exception:
+            pass
+
+
+def scan_package(package, names, manifest=None):
+    """Find modules in ``package`` that refer to any of ``names``.
+
+    This parses the source of each module in ``package`` and looks for
+    references to the specified ``names`` (e.g., decorators), which can
+    be plain names (``name``), attributes (``obj.name``), or imported
+    names (``from x import name``). Nothing in the package is imported.
+
+    Functions defined in the package that refer to any of ``names``
+    (e.g., decorators that call :func:`tangled.decorators.register_action`)
+    are added to ``names``, so modules that use *those* functions will be
+    found too. The same goes for classes whose methods refer to any of
+    ``names`` and for module level names assigned from expressions that
+    refer to any of them (e.g., ``route = make_decorator('route')``).
+
+    The references found in each module are cached by file path,
+    modification time, and size, so a file is only parsed again when it
+    changes. If ``manifest`` is passed, it's a path to a JSON file that's
+    used to persist the cache across processes.
+
+    Modules whose source can't be found or parsed are always included
+    since they can't be ruled out.
+
+    Returns a list of module names in package walk order.
+
+    """
+    names = set(names)
+    cache = _load_manifest(manifest) if manifest else _MANIFEST_CACHE
+    summaries = []
+    changed = False
+
+    for name, spec in iter_package_modules(package):
+        origin = spec.origin
+        if not (spec.has_location and origin and origin.endswith('.py')):
+            summaries.append((name, None))
+            continue
+        try:
+            stat = os.stat(origin)
+        except OSError:
+            summaries.append((name, None))
+            continue
+        entry = cache.get(origin)
+        stamp = (stat.st_mtime_ns, stat.st_size, _SUMMARY_VERSION)
+        if entry is None or (entry['mtime'], entry['size'], entry.get('version')) != stamp:
+            entry = {
+                'mtime': stat.st_mtime_ns,
+                'size': stat.st_size,
+                'version': _SUMMARY_VERSION,
+                'summary': _summarize_module(origin),
+            }
+            cache[origin] = entry
+            changed = True
+        summaries.append((name, entry['summary']))
+
+    if manifest and changed:
+        atomic_write_json(manifest, cache)
+
+    # Find functions that refer to any of the names, then functions
+    # that refer to *those* functions, etc.
+    while True:
+        new_names = set()
+        for _, summary in summaries:
+            if summary is not None:
+                for def_name, refs in summary['defs'].items():
+                    if def_name not in names and names.intersection(refs):
+                        new_names.add(def_name)
+        if not new_names:
+            break
+        names |= new_names
+
+    return [
+        name for name, summary in summaries
+        if summary is None or names.intersection(summary['refs'])
+    ]
+
+
+def _summarize_module(file_name):
+    """Collect the names referred to in a module.
+
+    Returns a dict with all the names referred to in the module
+    (``refs``) and the names referred to in each function defined in
+    the module (``defs``) or ``None`` if the module can't be parsed.
+
+    A class is treated as referring to the names its methods refer to
+    so that class-based decorators (e.g., a class that registers an
+    action in its ``__call__`` method) are linked to those names.
+    Likewise, a name assigned at module level is treated as referring
+    to the names on the right hand side of the assignment so that
+    decorators created by factories (e.g., ``route = make_decorator()``
+    or ``view = functools.partial(...)``) are linked too.
+
+    """
+    try:
+        with open(file_name, 'rb') as fp:
+            tree = ast.parse(fp.read(), file_name)
+    except (OSError, SyntaxError, ValueError):
+        return None
+    function_types = (ast.FunctionDef, ast.AsyncFunctionDef)
+    defs = {}
+    for node in ast.walk(tree):
+        if isinstance(node, function_types):
+            refs = _collect_refs(node)
+        elif isinstance(node, ast.ClassDef):
+            refs = set()
+            for child in node.body:
+                if isinstance(child, function_types):
+                    refs.update(_collect_refs(child))
+        else:
+            continue
+        refs.discard(node.name)
+        defs.setdefault(node.name, set()).update(refs)
+    for node in tree.body:
+        if isinstance(node, ast.Assign):
+            targets = node.targets
+        elif isinstance(node, ast.AnnAssign) and node.value is not None:
+            targets = [node.target]
+        else:
+            continue
+        refs = _collect_refs(node.value)
+        for target in targets:
+            for name_node in ast.walk(target):
+                if isinstance(name_node, ast.Name):
+                    defs.setdefault(name_node.id, set()).update(refs - {name_node.id})
+    return {
+        'refs': sorted(_collect_refs(tree)),
+        'defs': {name: sorted(refs) for name, refs in defs.items()},
+    }
+
+
+def _collect_refs(tree):
+    refs = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name):
+            refs.add(node.id)
+        elif isinstance(node, ast.Attribute):
+            refs.add(node.attr)
+        elif isinstance(node, ast.alias):
+            refs.add(node.asname or node.name.rpartition('.')[2])
+    return refs
+
+
+def _load_manifest(file_name):
+    try:
+        with open(file_name) as fp:
+            return json.load(fp)
+    except (OSError, ValueError):
+        return {}
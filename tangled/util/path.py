@@ -1,11 +1,13 @@
 import importlib
 import inspect
+import json
 import os
 
 
 __all__ = [
     'abs_path',
     'asset_path',
+    'atomic_write_json',
     'fully_qualified_name',
     'is_asset_path',
     'is_module_path',
@@ -70,6 +72,20 @@ def asset_path(path, *rel_path):
     return path
 
 
+def atomic_write_json(file_name, data):
+    """Write ``data`` as JSON to ``file_name`` atomically.
+
+    The data is written to a temporary file in the same directory first
+    and then moved into place, so readers in other processes never see
+    a partially written file.
+
+    """
+    temp_file_name = '{}.{}.tmp'.format(file_name, os.getpid())
+    with open(temp_file_name, 'w') as fp:
+        json.dump(data, fp)
+    os.replace(temp_file_name, file_name)
+
+
 def fully_qualified_name(obj):
     """Get the fully qualified name for an object.
 